@@ -0,0 +1,140 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+
+
+# running per-player aggregates (rows, counts, sums and sums of squares of each feature); new rows are folded in without rescanning the old ones
+class PlayerAggregates:
+    def __init__(self, features: list, state: pd.DataFrame = None, signature: list = None):
+        self.features = features
+        self.state = state if state is not None else self._empty_state(features)
+        self.signature = signature  # identifies the data that was folded in so far (e.g. the store version)
+
+    def update(self, df: pd.DataFrame):
+        if df.empty:
+            return
+
+        # the sums of squares lose too much precision in the compact float32 columns
+        values = df[self.features].astype('float64')
+        players = df['players']
+        grouped = pd.concat([
+            values.notna().groupby(players, observed=True).sum().add_suffix('_count'),
+            values.groupby(players, observed=True).sum().add_suffix('_sum'),
+            (values ** 2).groupby(players, observed=True).sum().add_suffix('_sumsq')
+        ], axis=1)
+        grouped['matches'] = players.groupby(players, observed=True).size()
+        grouped.index = grouped.index.astype(str)
+
+        self.state = self.state.add(grouped[self.state.columns], fill_value=0)
+
+    def means(self, threshold_matches: int = 1) -> pd.DataFrame:
+        state = self._filtered(threshold_matches)
+        means = pd.DataFrame({feature: state[f'{feature}_sum'] / state[f'{feature}_count'] for feature in self.features})
+        return means.rename_axis('players').reset_index()
+
+    def stds(self, threshold_matches: int = 1) -> pd.DataFrame:
+        # sample standard deviation, same as groupby().std()
+        state = self._filtered(threshold_matches)
+        stds = {}
+        for feature in self.features:
+            n, total, total_sq = state[f'{feature}_count'], state[f'{feature}_sum'], state[f'{feature}_sumsq']
+            variance = ((total_sq - total ** 2 / n) / (n - 1)).clip(lower=0)
+            stds[feature] = np.sqrt(variance)
+        return pd.DataFrame(stds).rename_axis('players').reset_index()
+
+    def save(self, path: str):
+        self.state.to_parquet(path)
+        with open(path + '.json', 'w') as f:
+            json.dump({'features': self.features, 'signature': self.signature}, f)
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.exists(path) or not os.path.exists(path + '.json'):
+            return None
+
+        with open(path + '.json', 'r') as f:
+            meta = json.load(f)
+        return cls(meta['features'], state=pd.read_parquet(path), signature=meta['signature'])
+
+    def _filtered(self, threshold_matches: int):
+        state = self.state[self.state['matches'] >= threshold_matches]
+        return state.sort_index()
+
+    @staticmethod
+    def _empty_state(features: list):
+        columns = ['matches'] + [f'{feature}_{stat}' for stat in ('count', 'sum', 'sumsq') for feature in features]
+        return pd.DataFrame(columns=columns, index=pd.Index([], name='players'), dtype='float64')
+
+
+# aggregate cube: the same counts and sums, per (player, team, bucket of bucket_size matches); a threshold, a team filter
+# or a range of buckets is a roll-up of these cells (a groupby-sum over a few thousand rows), not a new pass over the matches.
+# The per (player, team) and per (player, bucket) views are roll-ups too
+class AggregateCube:
+    def __init__(self, features: list, bucket_size: int = 1000, cells: pd.DataFrame = None, signature: list = None):
+        self.features = features
+        self.bucket_size = bucket_size
+        self.cells = cells if cells is not None else self._empty_cells(features)
+        self.signature = signature
+
+    def update(self, df: pd.DataFrame):
+        """
+        df: per-match rows with the players, the team, the match number and the features (DataCleaning.cube_df)
+        """
+        if df.empty:
+            return
+
+        values = df[self.features].astype('float64')
+        keys = [df['players'].astype(str).rename('players'), df['team'].astype(str).rename('team'),
+                (df['match'] // self.bucket_size).rename('bucket')]
+        grouped = pd.concat([
+            values.notna().groupby(keys).sum().add_suffix('_count'),
+            values.groupby(keys).sum().add_suffix('_sum')
+        ], axis=1)
+        grouped['matches'] = values.groupby(keys).size()
+
+        self.cells = self.cells.add(grouped[self.cells.columns], fill_value=0)
+
+    def roll_up(self, by: list, teams: list = None, buckets: tuple = None) -> pd.DataFrame:
+        """
+        Sums the cells by the given levels (e.g. ['players', 'team'] or ['players', 'bucket']).
+        teams: only the matches played for these teams
+        buckets: (first, last) bucket, both included
+        """
+        cells = self.cells
+        if teams:
+            cells = cells[cells.index.get_level_values('team').isin(teams)]
+        if buckets is not None:
+            bucket = cells.index.get_level_values('bucket')
+            cells = cells[(bucket >= buckets[0]) & (bucket <= buckets[1])]
+        return cells.groupby(level=by).sum()
+
+    def means(self, threshold_matches: int = 1, teams: list = None, buckets: tuple = None) -> pd.DataFrame:
+        # per-player means of the selected matches, same layout as third_stage_df
+        state = self.roll_up('players', teams=teams, buckets=buckets)
+        state = state[state['matches'] >= threshold_matches].sort_index()
+        means = pd.DataFrame({feature: state[f'{feature}_sum'] / state[f'{feature}_count'] for feature in self.features})
+        return means.rename_axis('players').reset_index()
+
+    def teams(self) -> list:
+        return sorted(self.cells.index.get_level_values('team').unique())
+
+    def save(self, path: str):
+        self.cells.to_parquet(path)
+        with open(path + '.json', 'w') as f:
+            json.dump({'features': self.features, 'bucket_size': self.bucket_size, 'signature': self.signature}, f)
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.exists(path) or not os.path.exists(path + '.json'):
+            return None
+
+        with open(path + '.json', 'r') as f:
+            meta = json.load(f)
+        return cls(meta['features'], meta['bucket_size'], cells=pd.read_parquet(path), signature=meta['signature'])
+
+    @staticmethod
+    def _empty_cells(features: list):
+        columns = ['matches'] + [f'{feature}_{stat}' for stat in ('count', 'sum') for feature in features]
+        index = pd.MultiIndex.from_arrays([[], [], []], names=['players', 'team', 'bucket'])
+        return pd.DataFrame(columns=columns, index=index, dtype='float64')
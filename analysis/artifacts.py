@@ -0,0 +1,191 @@
+from logger import Logger
+from aggregates import AggregateCube
+from datetime import datetime
+import pandas as pd
+import functools
+import threading
+import hashlib
+import shutil
+import json
+import os
+
+# bumped whenever the content or layout of the artifact changes; older artifacts are rebuilt
+ARTIFACT_VERSION = 2
+
+
+# everything the dashboard shows, precomputed: the per-player features, the clusters and PCA coordinates for each k, the k
+# sweep, and the aggregate cube behind the filters
+class DashboardArtifact:
+    def __init__(self, meta: dict, features: pd.DataFrame, clusters: dict, sweep: pd.DataFrame, cube: AggregateCube):
+        self.meta = meta
+        self.features = features
+        self.clusters = clusters  # k > dataframe with the PCA coordinates, the player and the cluster
+        self.sweep = sweep
+        self.cube = cube
+
+    def clustered_df(self, n_clusters: int) -> pd.DataFrame:
+        return self.clusters[n_clusters].copy()
+
+    @functools.cached_property
+    def similarity(self):
+        # built on first use; a new artifact (new data) comes with its own index, so it is rebuilt whenever the data changes
+        from similarity import SimilarityIndex
+        return SimilarityIndex(self.features)
+
+
+# artifacts on disk: one folder per build and a current.json pointing at the latest one, replaced atomically
+class ArtifactStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.pointer_path = os.path.join(path, 'current.json')
+        os.makedirs(path, exist_ok=True)
+
+    def load(self):
+        # the current artifact, or None if there is none or it was written by another version
+        if not os.path.exists(self.pointer_path):
+            return None
+
+        with open(self.pointer_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != ARTIFACT_VERSION:
+            return None
+
+        folder = os.path.join(self.path, meta['folder'])
+        features = pd.read_parquet(os.path.join(folder, 'features.parquet'))
+        clusters = {k: pd.read_parquet(os.path.join(folder, f'clusters_{k}.parquet')) for k in meta['n_clusters']}
+        sweep = pd.read_parquet(os.path.join(folder, 'sweep.parquet'))
+        cube = AggregateCube.load(os.path.join(folder, 'cube.parquet'))
+        return DashboardArtifact(meta, features, clusters, sweep, cube)
+
+    def save(self, artifact: DashboardArtifact):
+        folder = f"artifact_{artifact.meta['signature'][:12]}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        os.makedirs(os.path.join(self.path, folder))
+
+        artifact.features.to_parquet(os.path.join(self.path, folder, 'features.parquet'), index=False)
+        for k, df in artifact.clusters.items():
+            df.to_parquet(os.path.join(self.path, folder, f'clusters_{k}.parquet'), index=False)
+        artifact.sweep.to_parquet(os.path.join(self.path, folder, 'sweep.parquet'), index=False)
+        artifact.cube.save(os.path.join(self.path, folder, 'cube.parquet'))
+
+        artifact.meta['folder'] = folder
+        tmp_path = self.pointer_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(artifact.meta, f)
+        os.replace(tmp_path, self.pointer_path)
+
+        # the folders of older builds are only removed once the pointer no longer refers to them
+        for name in os.listdir(self.path):
+            if name.startswith('artifact_') and name != folder:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+
+def source_signature(filepath: str, params: dict) -> str:
+    # changes when a match file is added, removed or rewritten (same size/mtime check as the store), or when the parameters change
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+    entries = sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime) for entry in os.scandir(filepath)
+                     if entry.name.endswith('.csv'))
+    digest.update(json.dumps(entries).encode())
+    return digest.hexdigest()
+
+
+def build_artifact(logger: Logger, filepath: str, store_path: str, params: dict, signature: str,
+                   previous: DashboardArtifact = None) -> DashboardArtifact:
+    """
+    previous: artifact being replaced; the cluster numbers of the new one are renamed after its clusters, so the roles the
+    dashboard names by cluster number stay on the same players after a refresh
+    """
+    # the pipeline (and sklearn) is only imported when an artifact has to be built
+    from cleaning import DataCleaning
+    from clustering import final_data, model_selection
+
+    data_cleaning = DataCleaning(logger, filepath, verbose=False, store_path=store_path)
+    # the default view (every team, threshold_matches) is a roll-up of the cube, same values as third_stage_df
+    cube = data_cleaning.aggregate_cube()
+    features = cube.means(data_cleaning.threshold_matches)
+    clusters = {
+        k: final_data(features, logger, n_clusters=k, n_components=params['n_components'], random_state=params['random_state'])
+        for k in params['n_clusters']
+    }
+    if previous is not None:
+        for k, df in clusters.items():
+            if k in previous.clusters:
+                _align_clusters(df, previous.clusters[k], k)
+    sweep = model_selection(features, logger, cache_dir=os.path.join(store_path, 'sweeps'))
+
+    meta = {
+        'version': ARTIFACT_VERSION,
+        'signature': signature,
+        'n_clusters': list(params['n_clusters']),
+        'players': len(features),
+        'threshold_matches': data_cleaning.threshold_matches,
+        'created_at': datetime.now().isoformat(timespec='seconds')
+    }
+    return DashboardArtifact(meta, features, clusters, sweep, cube)
+
+
+def _align_clusters(df: pd.DataFrame, previous: pd.DataFrame, n_clusters: int):
+    # same matching as the filtered views of the dashboard, on the players both clusterings have
+    from stability import label_mapping
+
+    reference = previous.set_index('player')['cluster']
+    shared = df['player'].isin(reference.index).to_numpy()
+    if shared.any():
+        labels = df['cluster'].to_numpy()
+        mapping = label_mapping(labels[shared], reference.loc[df.loc[shared, 'player']].to_numpy(), n_clusters)
+        df['cluster'] = mapping[labels]
+
+
+# keeps the artifact of the dashboard up to date: serves the one on disk right away and rebuilds it in a background thread
+# whenever the match files (or the parameters) changed
+class ArtifactRefresher:
+    def __init__(self, logger: Logger, filepath: str, store_path: str, n_clusters=(4, 5), n_components: int = 2, random_state: int = 42,
+                 interval: int = 300):
+        """
+        interval: seconds between two checks of the match files
+        """
+        self.logger = logger
+        self.filepath = filepath
+        self.store_path = store_path
+        self.params = {'n_clusters': list(n_clusters), 'n_components': n_components, 'random_state': random_state}
+        self.interval = interval
+        self.artifacts = ArtifactStore(os.path.join(store_path, 'dashboard'))
+
+        self.current = self.artifacts.load()
+        self.building = False
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='artifact-refresh', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def refresh(self):
+        # rebuilds the artifact if it's missing or stale; returns True when a new one was built
+        signature = source_signature(self.filepath, self.params)
+        if self.current is not None and self.current.meta['signature'] == signature:
+            return False
+
+        self.building = True
+        try:
+            self.logger.log('Match files changed, rebuilding the dashboard data...' if self.current is not None
+                            else 'No dashboard data yet, building it...')
+            with self.logger.span('build_artifact'):
+                artifact = build_artifact(self.logger, self.filepath, self.store_path, self.params, signature, previous=self.current)
+            self.artifacts.save(artifact)
+            self.current = artifact  # swapped in one assignment; requests see either the old or the new artifact
+            self.logger.log(f"Dashboard data ready ({artifact.meta['players']} players)")
+        finally:
+            self.building = False
+        return True
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error(f'Could not refresh the dashboard data: {e}')
+            self.stopped.wait(self.interval)
@@ -1,14 +1,33 @@
 import pandas as pd
+import pyarrow as pa
 from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from logger import Logger
+from store import MatchStore
+from aggregates import AggregateCube, PlayerAggregates
 import os
 import re
 
+# columns read from the csv files (the economy-adjusted e* columns, the repeated KAST and MKs are never used); OpK-D is the
+# header of the older files, which also have no date and event
+READ_COLUMNS = {'players', 'Op.K-D', 'OpK-D', 'KAST', '1vsX', 'K(hs)', 'A(f)', 'D(t)', 'ADR', 'Swing', 'Rating3.0', 'team', 'date', 'event'}
+
+# compact layout of the player-match table: names are dictionary-encoded (one code per row instead of a python string)
+# and the numbers use the smallest type that holds them; in the raw (first stage) table the unparsed stats are arrow strings
+COLUMN_TYPES = {'players': 'category', 'team': 'category', 'ADR': 'float32', 'Rating3.0': 'float32', '1vsX': 'int16', 'match': 'int32'}
+RAW_TYPES = {**COLUMN_TYPES, 'date': 'datetime64[ns]', 'event': 'category',
+             **{column: pd.ArrowDtype(pa.string()) for column in ['Op.K-D', 'KAST', 'K(hs)', 'A(f)', 'D(t)', 'Swing']}}
+
 
 class DataCleaning:
-    def __init__(self, logger: Logger, filepath: str, threshold_matches: int = 50, verbose=True):
+    def __init__(self, logger: Logger, filepath: str, threshold_matches: int = 50, verbose=True, store_path: str = None,
+                 n_workers: int = 1, batch_size: int = 500):
         self.logger = logger
         self.filepath = filepath
+        self.store_path = store_path  # if set, the csv files are ingested into a columnar store and read from there
+        self.n_workers = n_workers  # processes used to read the csv files; each one reads batches of batch_size files
+        self.batch_size = batch_size
         self.threshold_matches = threshold_matches
         self.verbose = verbose
 
@@ -18,64 +37,255 @@ class DataCleaning:
         self.keep_columns = ['players', 'KAST', 'ADR', 'Swing', 'hs', 'opk', 'opd', '1vsX']
 
     def third_stage_df(self):
-        df = self._second_stage_df().copy()
+        if self.store_path is not None:
+            return self._aggregated_third_stage_df()
+
+        return self._player_means(self._second_stage_df())
+
+    def _player_means(self, df: pd.DataFrame):
+        with self.logger.span('aggregate'):
+            # average numeric features per player; the clustering will represent the players styles
+            grouped = df.groupby('players', observed=True)
+            player_means = grouped.mean(numeric_only=True)
+
+            # filtering to keep only the players with more than a certain amount of matches (after averaging, so the rows are not copied)
+            player_means = player_means[grouped.size() >= self.threshold_matches]
+
+            # the means are small, so they go back to plain names and float64 for the clustering
+            player_means = player_means.astype('float64')
+            player_means.index = player_means.index.astype(str)
+        return player_means.sort_index().rename_axis('players').reset_index()
+
+    def _aggregated_third_stage_df(self):
+        # same output as the batch computation, but only the matches added since the last run are parsed and folded in
+        files = self._list_files()
+        if files is None:
+            return
+
+        store = MatchStore(self.logger, self.store_path)
+        state_path = os.path.join(self.store_path, 'player_state.parquet')
+        features = self.keep_columns[1:]
+
+        aggregates = PlayerAggregates.load(state_path)
+        version = store.version()
+        with self.logger.span('read'):
+            added = store.ingest(files, self._read_files)
+
+        if aggregates is None or aggregates.features != features or aggregates.signature != version or store.invalidated:
+            self.logger.log('Rebuilding per-player aggregates from the store...')
+            aggregates = PlayerAggregates(features)
+            aggregates.update(self._timed_parse(self._compact(store.load(), RAW_TYPES)))
+        elif not added.empty:
+            aggregates.update(self._timed_parse(added))
+
+        aggregates.signature = store.version()
+        aggregates.save(state_path)
+        return aggregates.means(self.threshold_matches)
+
+    def second_stage_chunks(self, chunk_rows: int = 100_000):
+        """
+        Ingests the files into the store and returns a function that iterates over the parsed per-match rows, chunk_rows
+        at a time; each call starts a new pass over the store (the streaming clustering makes several). Needs store_path.
+        """
+        files = self._list_files()
+        if files is None:
+            return
+
+        store = MatchStore(self.logger, self.store_path)
+        store.ingest(files, self._read_files)
+
+        def chunks():
+            for df in store.iter_batches(chunk_rows):
+                yield self._parse_stats(self._compact(df, RAW_TYPES))
+        return chunks
+
+    def aggregate_cube(self, bucket_size: int = 1000):
+        """
+        Counts and sums of the features per (player, team, bucket of matches), for the filters of the dashboard. With a store,
+        the cube is kept next to it and only the matches added since the last run are folded in (like the per-player aggregates).
+        """
+        features = self.keep_columns[1:]
+        if self.store_path is None:
+            cube = AggregateCube(features, bucket_size)
+            cube.update(self.cube_df())
+            return cube
+
+        files = self._list_files()
+        if files is None:
+            return
 
-        # filtering to keep only the players with more than a certain amount of matches
-        match_counts = df['players'].value_counts()
-        players_with_enough_matches = match_counts[match_counts >= self.threshold_matches].index
-        df_filtered = df[df['players'].isin(players_with_enough_matches)]
+        store = MatchStore(self.logger, self.store_path)
+        state_path = os.path.join(self.store_path, 'cube_state.parquet')
+
+        cube = AggregateCube.load(state_path)
+        version = store.version()
+        with self.logger.span('read'):
+            added = store.ingest(files, self._read_files)
+
+        if cube is None or cube.features != features or cube.bucket_size != bucket_size or cube.signature != version or store.invalidated:
+            self.logger.log('Rebuilding the aggregate cube from the store...')
+            cube = AggregateCube(features, bucket_size)
+            cube.update(self._cube_rows(self._compact(store.load(), RAW_TYPES)))
+        elif not added.empty:
+            cube.update(self._cube_rows(added))
+
+        cube.signature = store.version()
+        cube.save(state_path)
+        return cube
+
+    def cube_df(self):
+        """
+        Per-match rows with the team and the match number, for the AggregateCube.
+        """
+        with self.logger.span('read'):
+            df = self._first_stage_df()
+        if df is None:
+            return
+        return self._cube_rows(df)
 
-        # average numeric features per player; the clustering will represent the players styles
-        player_means = df_filtered.groupby('players').mean(numeric_only=True).reset_index()
-        return player_means
+    def _cube_rows(self, df: pd.DataFrame):
+        return self._timed_parse(df).assign(team=df['team'].array, match=df['match'].array)
+
+    def timeline_df(self):
+        """
+        Per-match rows with the date and the event of the match, for the PlayerTimeline; the matches scraped before the date
+        was recorded are left out.
+        """
+        with self.logger.span('read'):
+            df = self._first_stage_df()
+        if df is None:
+            return
+
+        df = df[df['date'].notna()] if 'date' in df.columns else df.iloc[:0]
+        if df.empty:
+            return pd.DataFrame(columns=self.keep_columns + ['date', 'event', 'match']).astype({'date': 'datetime64[ns]'})
+        parsed = self._timed_parse(df)
+        return parsed.assign(date=df['date'].array, event=df['event'].array, match=df['match'].array)
 
     def _second_stage_df(self):
-        df = self._first_stage_df().copy()
+        with self.logger.span('read'):
+            df = self._first_stage_df()
+        return self._timed_parse(df)
+
+    def _timed_parse(self, df: pd.DataFrame):
+        with self.logger.span('parse'):
+            df = self._parse_stats(df)
+        self.logger.count('rows_parsed', len(df))
+        return df
+
+    def _parse_stats(self, df: pd.DataFrame):
+        # the parsed columns go into a new frame with only the kept columns; the raw frame is never copied
+        parsed = {}
 
+        # columns are parsed as a whole (vectorized) instead of cell by cell; e.g. '16(9)' > K=16, hs=9/16
         cols = ['K(hs)', 'A(f)', 'D(t)']
         for col in cols:
+            total_col = re.sub(r'\([a-z]+\)', '', col)
+            if col == 'A(f)' and total_col not in self.keep_columns:
+                continue  # the assists are not a feature, no need to parse them
+
+            total, inner = self._split_kad(df[col])
             if col != 'A(f)':
-                new_col = re.search(r'\(([a-z]+)\)', col).group(1)
-                df[new_col] = df[col].apply(self._modify_kad)
+                parsed[re.search(r'\(([a-z]+)\)', col).group(1)] = self._safe_ratio(inner, total)
+            parsed[total_col] = total
 
-            df[re.sub(r'\([a-z]+\)', '', col)] = df[col].apply(self._modify_kad_exclude)
+        opening = self._as_text(df['Op.K-D']).str.split(' : ', n=1, expand=True).astype('int32')
+        parsed['opk'] = self._safe_ratio(opening[0], parsed['K'])
+        parsed['opd'] = self._safe_ratio(opening[1], parsed['D'])
 
-        df[['opk', 'opd']] = df['Op.K-D'].str.split(' : ', n=1, expand=True).astype(int)
-        df['opk'] = df.apply(lambda r: r['opk'] / r['K'] if r['K'] != 0 else 0, axis=1)
-        df['opd'] = df.apply(lambda r: r['opd'] / r['D'] if r['D'] != 0 else 0, axis=1)
+        parsed['KAST'] = self._modify_perc_columns(df['KAST'])
+        parsed['Swing'] = self._modify_perc_columns(df['Swing'])
 
-        df['KAST'] = df['KAST'].apply(self._modify_perc_columns)
-        df['Swing'] = df['Swing'].apply(self._modify_perc_columns)
+        return self._compact(pd.DataFrame({col: parsed[col] if col in parsed else df[col] for col in self.keep_columns}))
 
-        return df[self.keep_columns]
+    @staticmethod
+    def _compact(df: pd.DataFrame, types: dict = None):
+        # casts (in place) the known columns to their compact type; the columns that already have it are left untouched
+        for column, dtype in (types or COLUMN_TYPES).items():
+            if column not in df.columns or df[column].dtype == dtype:
+                continue
+            if dtype == 'int16' and df[column].hasnans:
+                dtype = 'float32'
+            df[column] = df[column].astype(dtype)
+        return df
 
     @staticmethod
-    def _modify_perc_columns(value: str):
-        value = re.sub(r'\+|-|%', '', value)
-        return float(value) / 100
+    def _modify_perc_columns(values: pd.Series):
+        return DataCleaning._as_text(values).str.replace(r'\+|-|%', '', regex=True).astype('float32') / 100
 
     @staticmethod
-    def _modify_kad_exclude(value: str):
-        value = re.sub(r'\(\d+\)', '', value)
-        return int(value)
+    def _split_kad(values: pd.Series):
+        groups = DataCleaning._as_text(values).str.extract(r'(?P<total>\d+)\((?P<inner>\d+)\)').astype('int32')
+        return groups['total'], groups['inner']
 
     @staticmethod
-    def _modify_kad(value: str):
-        groups = re.search(r'(\d+)\((\d+)', value)
-        g1 = int(groups.group(1))
-        g2 = int(groups.group(2))
-        return (g2 / g1) if g1 != 0 else 0
+    def _as_text(values: pd.Series):
+        # arrow-backed strings run the .str methods in native code instead of a python loop per cell
+        return values.astype(pd.ArrowDtype(pa.string()))
+
+    @staticmethod
+    def _safe_ratio(numerator: pd.Series, denominator: pd.Series):
+        return (numerator / denominator).where(denominator != 0, 0).astype('float32')
 
     def _first_stage_df(self):
-        files = glob(os.path.join(self.filepath, r'*.csv'))
+        files = self._list_files()
+        if files is None:
+            return
+
+        if self.store_path is not None:
+            store = MatchStore(self.logger, self.store_path)
+            store.ingest(files, self._read_files)
+            return self._compact(store.load(), RAW_TYPES)
+
+        return self._read_files(files)
+
+    def _list_files(self):
+        files = sorted(glob(os.path.join(self.filepath, r'*.csv')))
         if len(files) == 0:
-            self.logger.log(f'ERROR: No .csv files in the folder {self.filepath}')
+            self.logger.error(f'No .csv files in the folder {self.filepath}')
             return
+        return files
 
-        dfs = [self._read_dataframe(file, match_number) for match_number, file in enumerate(files)]
-        df = pd.concat(dfs, ignore_index=True)
-        df = df.dropna(subset=['Rating3.0']).drop(self.drop_columns, axis=1, errors='ignore')
-        return df
+    def _read_files(self, files: list, first_match: int = 0):
+        if self.n_workers > 1 and len(files) > self.batch_size:
+            return self._read_files_parallel(files, first_match)
+
+        # the files are joined and compacted batch by batch, so only batch_size raw frames are alive at a time
+        dfs = []
+        for start in range(0, len(files), self.batch_size):
+            batch = [self._read_dataframe(file, match_number)
+                     for match_number, file in enumerate(files[start:start + self.batch_size], start=first_match + start)]
+            dfs.append(self._pre_clean(pd.concat(batch, ignore_index=True), self.drop_columns))
+        return self._concat(dfs)
+
+    def _read_files_parallel(self, files: list, first_match: int):
+        # the match numbers are fixed by the position of each file before the batches are sent out, so scheduling can't change them
+        starts = range(0, len(files), self.batch_size)
+        self.logger.log(f'Reading {len(files)} files ({len(starts)} batches, {self.n_workers} workers)...')
+
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            dfs = list(executor.map(
+                _read_batch,
+                [files[start:start + self.batch_size] for start in starts],
+                [first_match + start for start in starts],
+                repeat(self.drop_columns)
+            ))
+        return self._concat(dfs)
+
+    @staticmethod
+    def _concat(dfs: list):
+        # categorical columns only stay categorical through a concat if all the frames share the same categories
+        for column in ['players', 'team', 'event']:
+            present = [df for df in dfs if column in df.columns]  # batches of older files have no event
+            categories = sorted(set().union(*(df[column].cat.categories for df in present)))
+            for df in present:
+                df[column] = df[column].cat.set_categories(categories)
+        return pd.concat(dfs, ignore_index=True)
+
+    @staticmethod
+    def _pre_clean(df: pd.DataFrame, drop_columns: list):
+        df = df.dropna(subset=['Rating3.0']).drop(drop_columns, axis=1, errors='ignore')
+        return DataCleaning._compact(df.reset_index(drop=True), RAW_TYPES)
 
     def _read_dataframe(self, filename: str, match_number: int):
         """
@@ -92,9 +302,19 @@ class DataCleaning:
         """
 
         if self.verbose:
-            self.logger.log(f'Opening {filename}...')
+            self.logger.log('Opening %s...', filename)  # formatted by the writer thread, this runs once per file
+
+        return self._read_csv(filename, match_number)
 
-        df = pd.read_csv(filename)
+    @staticmethod
+    def _read_csv(filename: str, match_number: int):
+        df = pd.read_csv(filename, usecols=lambda column: column in READ_COLUMNS)  # types are set per batch, a dtype per file is slower
         df['match'] = match_number
         df = df.rename(columns={'OpK-D': 'Op.K-D'})
         return df
+
+
+# runs in the worker processes; reads and pre-cleans one batch of files
+def _read_batch(files: list, first_match: int, drop_columns: list):
+    dfs = [DataCleaning._read_csv(file, match_number) for match_number, file in enumerate(files, start=first_match)]
+    return DataCleaning._pre_clean(pd.concat(dfs, ignore_index=True), drop_columns)
@@ -1,31 +1,189 @@
 from logger import Logger
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-import matplotlib.pyplot as plt
-from sklearn.decomposition import PCA
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score
+from sklearn.decomposition import PCA, IncrementalPCA
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
 import pandas as pd
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.parquet as pq
+import hashlib
+import time
+import os
 
 
 # TODO: collect and identify in-game roles for each cluster (opener, awper, closer, etc.)
 
 
-def final_data(df_base: pd.DataFrame, logger: Logger, n_clusters: int, n_components: int, elbow=False):
-    features_x = df_base.select_dtypes(include=['float64', 'int64'])
-
-    scaler = StandardScaler()
-    x_scaled = scaler.fit_transform(features_x)
+def final_data(df_base: pd.DataFrame, logger: Logger, n_clusters: int, n_components: int, elbow=False, random_state=42, init=None):
+    with logger.span('scale'):
+        x_scaled = scale_features(df_base)
 
-    # elbow plot; the results indicates that for k=5 the rate of decrease in WCSS significantly slows down. k=4 seems good too
+    # elbow mode returns the k sweep instead of the clusters; the results indicates that for k=5 the rate of decrease in WCSS significantly slows down. k=4 seems good too
     if elbow:
-        logger.log('Generating elbow plot...')
-        elbow_plot(x_scaled)
-        exit()
+        logger.log('Running k sweep...')
+        with logger.span('sweep'):
+            return sweep_k(x_scaled, random_state=random_state)
 
     logger.log(f'Assigning clusters (using k-means, {n_clusters} clusters)...')
-    df_base['cluster'] = assign_clusters(x_scaled, k=n_clusters)
+    with logger.span('kmeans'):
+        df_players = df_base[['players']].assign(cluster=assign_clusters(x_scaled, k=n_clusters, random_state=random_state, init=init))
 
     logger.log(f'Applying PCA ({n_components} variables)...')
-    return apply_pca(x_scaled, df_base, n_components=n_components)
+    with logger.span('pca'):
+        return apply_pca(x_scaled, df_players, n_components=n_components)
+
+
+# out-of-core version of final_data, for the per-match rows that don't fit in memory: the data is read chunk by chunk in three
+# passes (scaler, then k-means and PCA, then labels and coordinates), so the memory only depends on the chunk size
+def streaming_final_data(chunks, logger: Logger, n_clusters: int, n_components: int, random_state=42, batch_rows: int = 10_000,
+                         n_epochs: int = 1, output_path: str = None):
+    """
+    chunks: function returning a new iterator over the dataframes (players + numeric features) at each call, e.g. the one
+    from DataCleaning.second_stage_chunks; it's called once per pass
+    batch_rows: rows per partial_fit call (the chunks are re-sliced to this size)
+    n_epochs: passes over the data for k-means
+    output_path: the result is written to this parquet file chunk by chunk instead of being returned as one dataframe
+    Returns the same columns as apply_pca (PC1..PCn, player, cluster), or output_path.
+    """
+    # the first partial_fit of k-means needs n_clusters rows and each one of IncrementalPCA n_components rows
+    min_rows = max(n_clusters, n_components)
+    scaler = StandardScaler()
+    rows = 0
+    logger.log('Fitting the scaler (streaming)...')
+    with logger.span('stream_scale'):
+        for x in _feature_batches(chunks(), batch_rows, min_rows):
+            scaler.partial_fit(x)
+            rows += len(x)
+    if rows < min_rows:
+        raise ValueError(f'Not enough rows to cluster: {rows} rows for {n_clusters} clusters and {n_components} components'
+                         f'{" (no match files in the store?)" if rows == 0 else ""}')
+
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3)
+    pca = IncrementalPCA(n_components=n_components)
+    logger.log(f'Fitting k-means ({n_clusters} clusters) and PCA ({n_components} variables) (streaming)...')
+    with logger.span('stream_fit'):
+        for epoch in range(n_epochs):
+            for x in _feature_batches(chunks(), batch_rows, min_rows):
+                x = _scaled(scaler, x)
+                if epoch == 0:
+                    pca.partial_fit(x)
+                kmeans.partial_fit(x)
+
+    logger.log('Assigning clusters (streaming)...')
+    writer = None
+    results = []
+    with logger.span('stream_assign'):
+        for df in chunks():
+            x = _scaled(scaler, _features(df))
+            result = pd.DataFrame(pca.transform(x).astype('float32'), columns=[f'PC{i}' for i in range(1, n_components + 1)])
+            result['player'] = df['players'].astype(str).to_numpy()
+            result['cluster'] = kmeans.predict(x).astype('int32')
+
+            if output_path is None:
+                result['player'] = result['player'].astype('category')
+                results.append(result)
+                continue
+            table = pa.Table.from_pandas(result, preserve_index=False)
+            writer = writer or pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+
+    if output_path is not None:
+        if writer is not None:
+            writer.close()
+        return output_path
+
+    if not results:
+        return pd.DataFrame(columns=[f'PC{i}' for i in range(1, n_components + 1)] + ['player', 'cluster'])
+    # the player categories differ between chunks; they're unified so the column stays categorical
+    players = pd.api.types.union_categoricals([result['player'] for result in results])
+    df = pd.concat([result.drop(columns='player') for result in results], ignore_index=True)
+    df.insert(n_components, 'player', players)
+    return df
+
+
+def _features(df: pd.DataFrame) -> np.ndarray:
+    return df.select_dtypes(include='number').to_numpy(dtype='float64')
+
+
+def _feature_batches(chunks, batch_rows: int, min_rows: int = 1):
+    # re-slices the chunks into batches of batch_rows rows (at least min_rows); each full batch is held back until the next
+    # one starts, so a last batch shorter than min_rows is folded into it. Only a dataset of fewer than min_rows rows gives
+    # a shorter batch
+    batch_rows = max(batch_rows, min_rows)
+    pending, pending_rows, full = [], 0, None
+    for df in chunks:
+        x = _features(df)
+        while len(x):
+            take = min(batch_rows - pending_rows, len(x))
+            pending.append(x[:take])
+            pending_rows += take
+            x = x[take:]
+            if pending_rows == batch_rows:
+                if full is not None:
+                    yield full
+                full = np.concatenate(pending)
+                pending, pending_rows = [], 0
+
+    if full is not None and 0 < pending_rows < min_rows:
+        pending, pending_rows = [full] + pending, pending_rows + len(full)
+    elif full is not None:
+        yield full
+    if pending:
+        yield np.concatenate(pending)
+
+
+def _scaled(scaler: StandardScaler, x: np.ndarray) -> np.ndarray:
+    # a missing stat (e.g. 1vsX on an old match page) is set to the mean of its column
+    return np.nan_to_num(scaler.transform(x), nan=0.0)
+
+
+# bounded LRU cache of final_data results; the key is (data fingerprint, n_clusters, n_components, random_state)
+class ClusterCache:
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self.results = OrderedDict()
+
+    def get(self, key):
+        if key not in self.results:
+            return None
+        self.results.move_to_end(key)
+        return self.results[key]
+
+    def put(self, key, result: pd.DataFrame):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_size:
+            self.results.popitem(last=False)  # evicts the least recently used result
+
+
+cluster_cache = ClusterCache()
+
+
+def cached_final_data(df_base: pd.DataFrame, logger: Logger, n_clusters: int, n_components: int, random_state=42, cache: ClusterCache = None):
+    cache = cache if cache is not None else cluster_cache
+    key = (data_fingerprint(df_base), n_clusters, n_components, random_state)
+
+    result = cache.get(key)
+    logger.count('cluster_cache_hits' if result is not None else 'cluster_cache_misses')
+    if result is None:
+        result = final_data(df_base, logger, n_clusters=n_clusters, n_components=n_components, random_state=random_state)
+        cache.put(key, result)
+
+    return result.copy()  # callers may add columns (e.g. roles) without touching the cached frame
+
+
+def scale_features(df_base: pd.DataFrame):
+    features_x = df_base.select_dtypes(include=['float64', 'int64'])
+    return StandardScaler().fit_transform(features_x)
+
+
+def data_fingerprint(df: pd.DataFrame) -> str:
+    hashed = pd.util.hash_pandas_object(df, index=True).values
+    return hashlib.sha1(hashed.tobytes() + ','.join(map(str, df.columns)).encode()).hexdigest()
 
 
 # applying PCA to reduce dimension and then visualize the clusters
@@ -45,22 +203,118 @@ def apply_pca(x, df_players, n_components=2):
     return df
 
 
-def assign_clusters(x, k=5):
-    kmeans = KMeans(n_clusters=k, random_state=42)
+def assign_clusters(x, k=5, random_state=42, init=None):
+    # init: starting centroids (k x features), e.g. the ones of the previous time window; a single run from there instead of k-means++
+    if init is None:
+        kmeans = KMeans(n_clusters=k, random_state=random_state)
+    else:
+        kmeans = KMeans(n_clusters=k, init=init, n_init=1, random_state=random_state)
     labels = kmeans.fit_predict(x)
     return labels
 
 
+def windowed_final_data(timeline, logger: Logger, n_clusters: int, n_components: int, days: int = 90, step_days: int = 30,
+                        min_matches: int = 10, random_state=42) -> pd.DataFrame:
+    """
+    final_data on each rolling window of a PlayerTimeline (per-player means over the last days, every step_days), for the
+    drift of the roles over time. Each window starts k-means from the centroids of the previous one, which is a single run
+    instead of the k-means++ inits, and keeps the cluster number of a role the same from one window to the next.
+    Returns the apply_pca columns plus window_end, one block of rows per window.
+    """
+    results = []
+    centroids = None
+    for window_end, df_window in timeline.rolling(days, step_days, min_matches=min_matches):
+        # a feature with no value in the window is NaN (e.g. a stat missing from older match pages); k-means can't take
+        # it, so the player is left out of that window, as the rows without a rating are in the cleaning
+        df_window = df_window.dropna().reset_index(drop=True)
+        if len(df_window) < n_clusters:
+            logger.log(f'Window ending {window_end:%Y-%m-%d} skipped ({len(df_window)} players with every feature)')
+            continue
+
+        result = final_data(df_window, logger, n_clusters=n_clusters, n_components=n_components, random_state=random_state, init=centroids)
+        # same scaling as scale_features (population std, constant columns left as they are), without a second sklearn pass
+        features_x = df_window.select_dtypes(include=['float64', 'int64']).to_numpy()
+        std = features_x.std(axis=0)
+        x_scaled = (features_x - features_x.mean(axis=0)) / np.where(std == 0, 1, std)
+        labels = result['cluster'].to_numpy()
+        # a cluster left empty keeps its previous centroid
+        centroids = np.vstack([
+            x_scaled[labels == cluster].mean(axis=0) if (labels == cluster).any() else centroids[cluster]
+            for cluster in range(n_clusters)
+        ])
+        results.append(result.assign(window_end=window_end))
+
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+
+def model_selection(df_base: pd.DataFrame, logger: Logger, cache_dir: str = None, **kwargs) -> pd.DataFrame:
+    logger.log('Running k sweep...')
+    return sweep_k(scale_features(df_base), cache_dir=cache_dir, **kwargs)
+
+
+def sweep_k(x, k_values=range(1, 11), n_jobs: int = None, mini_batch=False, random_state=42, silhouette_sample: int = 5000,
+            cache_dir: str = None) -> pd.DataFrame:
+    """
+    Fits one k-means per k (in parallel, n_jobs processes; None uses all cores) and scores each fit.
+    wcss: within-cluster sum of squares (elbow method)
+    silhouette: from -1 to 1, higher is better (computed on a sample of silhouette_sample points)
+    calinski_harabasz: higher is better
+    davies_bouldin: lower is better
+    mini_batch: uses MiniBatchKMeans, much faster for large inputs
+    The results are saved in cache_dir (if given), keyed by the data and the parameters.
+    """
+    k_values = list(k_values)
+    cache_file = None
+    if cache_dir is not None:
+        key = hashlib.sha1(np.ascontiguousarray(x).tobytes() + repr((k_values, mini_batch, random_state, silhouette_sample)).encode()).hexdigest()
+        cache_file = os.path.join(cache_dir, f'sweep_{key}.parquet')
+        if os.path.exists(cache_file):
+            return pd.read_parquet(cache_file)
+
+    n_jobs = n_jobs or os.cpu_count()
+    args = (k_values, repeat(x), repeat(mini_batch), repeat(random_state), repeat(silhouette_sample))
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(k_values))) as executor:
+            rows = list(executor.map(_score_k, *args))
+    else:
+        rows = list(map(_score_k, *args))
+
+    sweep = pd.DataFrame(rows)
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        sweep.to_parquet(cache_file, index=False)
+    return sweep
+
+
+def _score_k(k: int, x, mini_batch: bool, random_state: int, silhouette_sample: int) -> dict:
+    start = time.perf_counter()
+    if mini_batch:
+        model = MiniBatchKMeans(n_clusters=k, n_init=3, random_state=random_state)
+    else:
+        model = KMeans(n_clusters=k, init='k-means++', max_iter=300, n_init=10, random_state=random_state)
+    labels = model.fit_predict(x)
+
+    # the scores are not defined for a single cluster
+    scores = {'silhouette': np.nan, 'calinski_harabasz': np.nan, 'davies_bouldin': np.nan}
+    if 1 < k < len(x):
+        sample_size = silhouette_sample if len(x) > silhouette_sample else None
+        scores = {
+            'silhouette': silhouette_score(x, labels, sample_size=sample_size, random_state=random_state),
+            'calinski_harabasz': calinski_harabasz_score(x, labels),
+            'davies_bouldin': davies_bouldin_score(x, labels)
+        }
+
+    return {'k': k, 'wcss': model.inertia_, **scores, 'fit_seconds': time.perf_counter() - start}
+
+
 # helps find the optimal k (number of clusters)
 def elbow_plot(x):
-    wcss = []
-    for i in range(1, 11):
-        kmeans = KMeans(n_clusters=i, init='k-means++', max_iter=300, n_init=10, random_state=42)
-        kmeans.fit(x)
-        wcss.append(kmeans.inertia_)  # inertia_ is the WCSS (Within-Cluster Sum of Squares)
+    import matplotlib.pyplot as plt  # only needed for this interactive plot
+
+    sweep = sweep_k(x)
 
     plt.figure(figsize=(8, 6))
-    plt.plot(range(1, 11), wcss, marker='o', linestyle='--')
+    plt.plot(sweep['k'], sweep['wcss'], marker='o', linestyle='--')
     plt.title('Elbow Method for Optimal K')
     plt.xlabel('Number of Clusters (K)')
     plt.ylabel('WCSS')
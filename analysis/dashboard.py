@@ -1,17 +1,20 @@
-import plotly.express as px
-from cleaning import DataCleaning
-from clustering import final_data
+from artifacts import ArtifactRefresher
+from figures import FigureCache, scatter_figure
+from plotly.subplots import make_subplots
+import plotly.graph_objects as go
 from logger import Logger
 import os
 from dotenv import load_dotenv
-from dash import Dash, dcc, html, Output, Input
+from dash import Dash, dcc, html, Output, Input, State, Patch, no_update
 import dash_bootstrap_components as dbc
 import plotly.io as pio
+import functools
 
 
 load_dotenv()
-logger = Logger()
+logger = Logger(metrics=os.getenv('METRICS_PATH') is not None, metrics_path=os.getenv('METRICS_PATH'))  # startup timings of the data stages
 filepath = os.getenv('FILEPATH')
+store_path = os.getenv('STORE_PATH', os.path.join(filepath, 'store'))  # consolidated copy of the csv files and the dashboard data
 
 # mapping the clusters to the in-game roles; the first set of keys represents the number of clusters
 roles = {
@@ -32,145 +35,285 @@ roles = {
 }
 
 
-logger.log('Cleaning data...')
-dc = DataCleaning(logger, filepath, verbose=False)
-df = dc.third_stage_df()
+# the clusters, PCA coordinates (3 PCs, the 2D plots use the first two) and the k sweep are read from the last precomputed
+# artifact, so starting the dashboard doesn't run the pipeline; it is rebuilt in the background when the match files change
+refresher = ArtifactRefresher(logger, filepath, store_path, n_clusters=list(roles), n_components=3,
+                              interval=int(os.getenv('REFRESH_INTERVAL', 300)))
 
 
-def clustered_df(n_clusters=4, n_components=2):
-    df_plot = final_data(df, logger, n_clusters=n_clusters, n_components=n_components)
+def clustered_df(n_clusters=4):
+    df_plot = refresher.current.clustered_df(n_clusters)
     df_plot['role'] = df_plot['cluster'].map(roles[n_clusters])
     return df_plot
 
 
+# clusters of the players selected by the filters; the default selection is the precomputed one, any other is a roll-up of
+# the aggregate cube, clustered again only when the selected population (and so its features) is new
+def filtered_df(n_clusters: int, threshold: int, teams: list):
+    artifact = refresher.current
+    if threshold == artifact.meta['threshold_matches'] and not teams:
+        return clustered_df(n_clusters)
+
+    from clustering import cached_final_data  # sklearn is only loaded when a filter is used
+    from stability import label_mapping
+    df_base = artifact.cube.means(threshold, teams=teams)
+    if len(df_base) < max(roles):
+        return None
+
+    df_plot = cached_final_data(df_base, logger, n_clusters=n_clusters, n_components=3)
+    # the cluster numbers of a new k-means run are arbitrary; they are renamed after the precomputed clusters (the ones the
+    # roles were named from), matched on the players both have, before the roles are mapped
+    reference = artifact.clusters[n_clusters].set_index('player')['cluster']
+    shared = df_plot['player'].isin(reference.index).to_numpy()
+    if shared.any():
+        labels = df_plot['cluster'].to_numpy()
+        mapping = label_mapping(labels[shared], reference.loc[df_plot.loc[shared, 'player']].to_numpy(), n_clusters)
+        df_plot['cluster'] = mapping[labels]
+    df_plot['role'] = df_plot['cluster'].map(roles[n_clusters])
+    return df_plot
+
+
+# figures are built once per artifact and parameters, then served from the cache as plain dicts; WebGL traces, and above
+# MAX_POINTS points a decimated view (the density of all the points can be shown with the density button)
+figure_cache = FigureCache()
+max_points = int(os.getenv('MAX_POINTS', 5000))
+
+
 def generate_fig(dimension=2, n_clusters=4):
-    if dimension == 3:
-        fig = px.scatter_3d(
-            clustered_df(n_clusters=n_clusters, n_components=3),
-            x='PC1', y='PC2', z='PC3',
-            color='role',
-            hover_name='player',
-            title=f'{n_clusters} clusters',
-            color_discrete_sequence=px.colors.qualitative.Set1
-        )
-        fig.update_layout(
-            scene=dict(
-                xaxis_title='',
-                yaxis_title='',
-                zaxis_title=''
-            )
-        )
-    else:
-        fig = px.scatter(
-            clustered_df(n_clusters=n_clusters),
-            x='PC1', y='PC2',
-            color='role',
-            hover_name='player',
-            title=f'{n_clusters} clusters',
-            color_discrete_sequence=px.colors.qualitative.Set1
-        )
-
-    fig.update_xaxes(showgrid=False)
-    fig.update_yaxes(showgrid=False)
+    key = (refresher.current.meta['signature'], dimension, n_clusters, max_points)
+    return figure_cache.get(key, lambda: scatter_figure(clustered_df(n_clusters=n_clusters), title=f'{n_clusters} clusters', dimension=dimension,
+                                                        max_points=max_points, show_density=False))
 
-    fig.update_traces(
-        hovertemplate="<b>%{hovertext}</b><extra></extra>"
-    )
 
+# WCSS (elbow) and silhouette for k=1..10
+def sweep_fig():
+    sweep = refresher.current.sweep
+
+    fig = make_subplots(specs=[[{'secondary_y': True}]])
+    fig.add_trace(go.Scatter(x=sweep['k'], y=sweep['wcss'], name='WCSS', mode='lines+markers'), secondary_y=False)
+    fig.add_trace(go.Scatter(x=sweep['k'], y=sweep['silhouette'], name='silhouette', mode='lines+markers'), secondary_y=True)
+
+    fig.update_xaxes(showgrid=False, title_text='Number of Clusters (K)', dtick=1)
+    fig.update_yaxes(showgrid=False)
     fig.update_layout(
-        xaxis_title=None,
-        yaxis_title=None,
-        legend_title_text='role',
-        legend=dict(
-            title=None,
-            font=dict(size=12),
-            itemsizing='trace',
-            orientation='v',
-            x=0.9, y=0.9
-        ),
+        title='Choosing the number of clusters',
         plot_bgcolor="#1e1e1e",
         paper_bgcolor="#1e1e1e",
         margin=dict(t=50, b=50),
-        height=700
+        height=400
     )
     return fig
 
 
 pio.templates.default = 'plotly_dark'
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], title='Counter-Strike', assets_folder=os.path.join(os.getcwd(), "../assets"))
+# the callbacks target components that are not in the placeholder layout shown while the data is first built
+app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], title='Counter-Strike', assets_folder=os.path.join(os.getcwd(), "../assets"),
+           suppress_callback_exceptions=True)
+
+
+# the layout is picked on each page load, so a refreshed artifact shows up on the next reload
+def serve_layout():
+    if refresher.current is None:
+        return dbc.Container([
+            html.H3("Preparing the data for the first time, reload the page in a moment...", style={'color': 'white', 'padding': '40px'})
+        ], fluid=True, style={'backgroundColor': '#121212', 'minHeight': '100vh'})
+
+    return artifact_layout(refresher.current)
 
-app.layout = dbc.Container([
-    html.Div([
-        html.Img(src=app.get_asset_url('cs_logo.png'), style={'width': '50px'}),
-        html.H1("Professional Players - Roles", style={'display': 'inline-block', 'margin': '10px', 'vertical-align': 'left', 'color': 'white'}),
-        html.Div(
-            dbc.Button("Show Names", id="toggle-btn", n_clicks=0, color="primary"),
-            style={'textAlign': 'right', 'marginLeft': '1000px'}
-        ),
-    ], style={'display': 'flex', 'align-items': 'center', 'padding': '20px'}),
 
-    html.Div(style={'height': '30px'}),
+# the figures only change with the artifact, so they are built once per artifact instead of once per page load
+@functools.lru_cache(maxsize=1)
+def artifact_layout(artifact):
+    return dbc.Container([
+        html.Div([
+            html.Img(src=app.get_asset_url('cs_logo.png'), style={'width': '50px'}),
+            html.H1("Professional Players - Roles", style={'display': 'inline-block', 'margin': '10px', 'vertical-align': 'left', 'color': 'white'}),
+            html.Div([
+                dbc.Button("Show Names", id="toggle-btn", n_clicks=0, color="primary"),
+                dbc.Button("Show Density", id="density-btn", n_clicks=0, color="secondary", style={'marginLeft': '10px'})
+            ], style={'textAlign': 'right', 'marginLeft': '1000px'}),
+        ], style={'display': 'flex', 'align-items': 'center', 'padding': '20px'}),
 
-    dbc.Row([
+        # filters: answered from the aggregate cube of the artifact, the match files are not read again
         dbc.Row([
-            dbc.Col(
-                dcc.Graph(id='fig4', figure=generate_fig(dimension=2, n_clusters=4)),
-                width=6
-            ),
-            dbc.Col(
-                dcc.Graph(id='fig5', figure=generate_fig(dimension=2, n_clusters=5)),
-                width=6
-            )
-        ], className='mb-5'),
-
-        # uncomment below to visualize the 3D plot (3 PCs)
-        # dbc.Row([
-        #     dbc.Col(
-        #         dcc.Graph(figure=generate_fig(dimension=3, n_clusters=4)),
-        #         width=6
-        #     )
-        # ], className='mb-5')
-    ])
-], fluid=True, style={'backgroundColor': '#121212', 'minHeight': '100vh', 'paddingBottom': '50px'})
+            dbc.Col([
+                html.Label("Minimum matches", style={'color': 'white'}),
+                dcc.Slider(id='threshold-slider', min=1, max=200, step=1, value=artifact.meta['threshold_matches'],
+                           marks={value: str(value) for value in (1, 25, 50, 100, 150, 200)}, tooltip={'placement': 'bottom'})
+            ], width=4),
+            dbc.Col([
+                html.Label("Teams", style={'color': 'white'}),
+                dcc.Dropdown(id='team-dropdown', options=artifact.cube.teams(), multi=True, placeholder='All teams', style={'color': 'black'})
+            ], width=4),
+            dbc.Col([
+                html.Label("Player search", style={'color': 'white'}),
+                dbc.Input(id='player-search', type='text', placeholder='Name contains...', debounce=True)
+            ], width=2),
+            dbc.Col(html.Div(id='population', style={'color': 'white', 'marginTop': '30px'}), width=2)
+        ], style={'padding': '0 20px 30px 20px'}),
 
+        dbc.Row([
+            dbc.Row([
+                dbc.Col(
+                    dcc.Graph(id='fig4', figure=generate_fig(dimension=2, n_clusters=4)),
+                    width=6
+                ),
+                dbc.Col(
+                    dcc.Graph(id='fig5', figure=generate_fig(dimension=2, n_clusters=5)),
+                    width=6
+                )
+            ], className='mb-5'),
 
-@app.callback(
+            dbc.Row([
+                dbc.Col(
+                    dcc.Graph(id='sweep', figure=sweep_fig()),
+                    width=6
+                )
+            ], className='mb-5'),
+
+            # nearest neighbours in the scaled feature space (the similarity index of the artifact)
+            dbc.Row([
+                dbc.Col([
+                    html.H4("Similar players", style={'color': 'white'}),
+                    dcc.Dropdown(id='player-dropdown', options=sorted(artifact.features['players'].astype(str)), placeholder='Player',
+                                 style={'color': 'black'}),
+                    html.Div(id='similar-table', style={'marginTop': '10px'})
+                ], width=6),
+                dbc.Col([
+                    html.H4("Most typical players of a role", style={'color': 'white'}),
+                    dcc.Dropdown(id='role-dropdown', options=[{'label': role, 'value': cluster} for cluster, role in roles[4].items()],
+                                 placeholder='Role (4 clusters)', style={'color': 'black'}),
+                    html.Div(id='typical-table', style={'marginTop': '10px'})
+                ], width=6)
+            ], className='mb-5'),
+
+            # uncomment below to visualize the 3D plot (3 PCs)
+            # dbc.Row([
+            #     dbc.Col(
+            #         dcc.Graph(figure=generate_fig(dimension=3, n_clusters=4)),
+            #         width=6
+            #     )
+            # ], className='mb-5')
+        ])
+    ], fluid=True, style={'backgroundColor': '#121212', 'minHeight': '100vh', 'paddingBottom': '50px'})
+
+
+app.layout = serve_layout
+
+
+# runs in the browser: showing/hiding the names only changes the text of the traces, so the server (and the clustering) is not involved
+app.clientside_callback(
+    """
+    function(n_clicks, fig4, fig5) {
+        const show = (n_clicks || 0) % 2 === 1;  // odd clicks > show names
+        const toggle = (fig) => ({
+            ...fig,
+            data: fig.data.map((trace) => !trace.hovertext ? trace : ({
+                ...trace,
+                text: show ? trace.hovertext : null,
+                mode: show ? 'markers+text' : 'markers',
+                textposition: 'top center',
+                textfont: {color: 'white', size: 10}
+            }))
+        });
+        return [toggle(fig4), toggle(fig5), show ? 'Hide Names' : 'Show Names'];
+    }
+    """,
     [Output("fig4", "figure"),
      Output("fig5", "figure"),
      Output("toggle-btn", "children")],
-    Input("toggle-btn", "n_clicks")
+    Input("toggle-btn", "n_clicks"),
+    [State("fig4", "figure"),
+     State("fig5", "figure")]
 )
-def toggle_names(n_clicks):
-    show = (n_clicks or 0) % 2 == 1  # odd clicks > show names
 
-    fig4 = generate_fig(dimension=2, n_clusters=4)
-    fig5 = generate_fig(dimension=2, n_clusters=5)
 
-    for fig in (fig4, fig5):
-        for trace in fig.data:
-            hover_text = getattr(trace, "hovertext", None)
-            if show:
-                if hover_text is not None:
-                    trace.text = hover_text
-                else:
-                    trace.text = None
+# only the visibility of the density trace (the last one) is sent, not the figures
+@app.callback(
+    [Output("fig4", "figure", allow_duplicate=True),
+     Output("fig5", "figure", allow_duplicate=True),
+     Output("density-btn", "children")],
+    Input("density-btn", "n_clicks"),
+    prevent_initial_call=True
+)
+def toggle_density(n_clicks):
+    show = n_clicks % 2 == 1
+    patch = Patch()
+    patch['data'][-1]['visible'] = show
+    return patch, patch, 'Hide Density' if show else 'Show Density'
+
+
+def with_names(fig):
+    # same change as the names button (clientside callback above), for figures built on the server while the names are shown
+    fig.for_each_trace(lambda trace: trace.update(text=trace.hovertext, mode='markers+text', textposition='top center',
+                                                  textfont=dict(color='white', size=10)), selector=lambda trace: trace.hovertext is not None)
+    return fig
+
+
+# the figures of the filtered players; the search only narrows the points shown, it doesn't change the clustering. The new
+# figures keep the names and the density as the buttons left them, so the view and the button labels agree
+@app.callback(
+    [Output("fig4", "figure", allow_duplicate=True),
+     Output("fig5", "figure", allow_duplicate=True),
+     Output("population", "children")],
+    [Input("threshold-slider", "value"),
+     Input("team-dropdown", "value"),
+     Input("player-search", "value")],
+    [State("toggle-btn", "n_clicks"),
+     State("density-btn", "n_clicks")],
+    prevent_initial_call=True
+)
+def filter_players(threshold, teams, search, names_clicks, density_clicks):
+    teams = sorted(teams or [])
+    search = (search or '').strip().lower()
+    show_names, show_density = (names_clicks or 0) % 2 == 1, (density_clicks or 0) % 2 == 1
+
+    figures = []
+    for n_clusters in (4, 5):
+        df_plot = filtered_df(n_clusters, threshold, teams)
+        if df_plot is None:
+            return no_update, no_update, f'Not enough players with {threshold}+ matches'
+
+        key = (refresher.current.meta['signature'], threshold, tuple(teams), search, 2, n_clusters, max_points, show_names, show_density)
+        df_shown = df_plot[df_plot['player'].str.lower().str.contains(search, regex=False)] if search else df_plot
+
+        def build():
+            fig = scatter_figure(df_shown, title=f'{n_clusters} clusters', max_points=max_points, show_density=show_density)
+            return with_names(fig) if show_names else fig
+        figures.append(figure_cache.get(key, build))
+
+    return figures[0], figures[1], f'{len(df_plot)} players'
+
+
+def neighbours_table(df):
+    return dbc.Table.from_dataframe(df.round({'distance': 3}), striped=True, bordered=False, hover=True, color='dark', size='sm')
+
+
+@app.callback(Output('similar-table', 'children'), Input('player-dropdown', 'value'), prevent_initial_call=True)
+def similar_players(player):
+    index = refresher.current.similarity
+    if player is None or player not in index:
+        return None
+    return neighbours_table(index.similar(player, k=10))
 
-                base_mode = getattr(trace, "mode", "markers")
-                if "text" not in base_mode:
-                    trace.mode = base_mode + "+text" if base_mode else "markers+text"
 
-                trace.textposition = "top center"
-                trace.textfont = dict(color="white", size=10)
-            else:
-                trace.text = None
-                mode = getattr(trace, "mode", "markers")
-                if "text" in mode:
-                    trace.mode = mode.replace("+text", "").replace("text+", "").strip("+")
+@app.callback(Output('typical-table', 'children'), Input('role-dropdown', 'value'), prevent_initial_call=True)
+def typical_players(cluster):
+    if cluster is None:
+        return None
+    df_plot = refresher.current.clustered_df(4)
+    return neighbours_table(refresher.current.similarity.closest_to(df_plot.loc[df_plot['cluster'] == cluster, 'player'], k=10))
 
-    button_label = "Hide Names" if show else "Show Names"
 
-    return fig4, fig5, button_label
+# the refresh thread is started by the first request, so it only runs in the process that serves the app (not in the
+# debug reloader that watches the files)
+@app.server.before_request
+def start_refresher():
+    refresher.start()
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    try:
+        app.run(debug=True)
+    finally:
+        logger.log_summary()  # when the server stops, so the summary covers the whole run
@@ -0,0 +1,116 @@
+import plotly.graph_objects as go
+import plotly.colors
+import plotly.io as pio
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+import json
+
+COLORS = plotly.colors.qualitative.Set1
+BACKGROUND = '#1e1e1e'
+
+
+# scatter of the players in the PCA space, one WebGL trace per role; above max_points the points are decimated (same
+# share of every cluster) and the full distribution is shown as a density contour binned here, so the payload only
+# grows with max_points and bins, not with the number of rows
+def scatter_figure(df_plot: pd.DataFrame, title: str, dimension: int = 2, max_points: int = 5000, bins: int = 50,
+                   show_density: bool = None, random_state: int = 42) -> go.Figure:
+    """
+    df_plot: PCA coordinates (PC1, PC2[, PC3]) with the player, the cluster and the role of each row
+    show_density: shows the density contour; by default only when the points were decimated
+    """
+    decimated = len(df_plot) > max_points
+    df_points = decimate(df_plot, max_points, random_state) if decimated else df_plot
+    # 3 decimals are plenty on screen and cut the size of the serialized coordinates by ~4x
+    df_points = df_points.round({'PC1': 3, 'PC2': 3, 'PC3': 3})
+
+    fig = go.Figure()
+    for color, (role, group) in zip(_cycle(COLORS), df_points.groupby('role', sort=False)):
+        if dimension == 3:
+            fig.add_trace(go.Scatter3d(
+                x=group['PC1'], y=group['PC2'], z=group['PC3'], mode='markers', name=role, hovertext=group['player'],
+                marker=dict(color=color)
+            ))
+        else:
+            fig.add_trace(go.Scattergl(
+                x=group['PC1'], y=group['PC2'], mode='markers', name=role, hovertext=group['player'], marker=dict(color=color)
+            ))
+
+    if dimension == 3:
+        fig.update_layout(scene=dict(xaxis_title='', yaxis_title='', zaxis_title=''))
+    else:
+        # always present (the density toggle only flips its visibility); the last trace of the figure
+        fig.add_trace(density_trace(df_plot['PC1'].to_numpy(), df_plot['PC2'].to_numpy(), bins,
+                                    visible=decimated if show_density is None else show_density))
+
+    fig.update_xaxes(showgrid=False)
+    fig.update_yaxes(showgrid=False)
+    fig.update_traces(hovertemplate="<b>%{hovertext}</b><extra></extra>", selector=dict(mode='markers'))
+
+    fig.update_layout(
+        template='plotly_dark',
+        title=title + (f' ({len(df_points):,} of {len(df_plot):,} points)' if decimated else ''),
+        xaxis_title=None,
+        yaxis_title=None,
+        legend=dict(
+            title=None,
+            font=dict(size=12),
+            itemsizing='trace',
+            orientation='v',
+            x=0.9, y=0.9
+        ),
+        plot_bgcolor=BACKGROUND,
+        paper_bgcolor=BACKGROUND,
+        margin=dict(t=50, b=50),
+        height=700
+    )
+    return fig
+
+
+def decimate(df_plot: pd.DataFrame, max_points: int, random_state: int = 42) -> pd.DataFrame:
+    # the same fraction of every cluster, so small clusters don't vanish from the plot
+    fraction = max_points / len(df_plot)
+    return df_plot.groupby('cluster', group_keys=False).sample(frac=fraction, random_state=random_state)
+
+
+def density_trace(x: np.ndarray, y: np.ndarray, bins: int = 50, visible: bool = True) -> go.Contour:
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    return go.Contour(
+        x=np.round((x_edges[:-1] + x_edges[1:]) / 2, 3),
+        y=np.round((y_edges[:-1] + y_edges[1:]) / 2, 3),
+        z=np.round(np.log1p(counts.T), 2),  # log scale, otherwise the dense center hides everything else
+        name='density',
+        showscale=False,
+        hoverinfo='skip',
+        colorscale='Greys',
+        opacity=0.5,
+        contours=dict(coloring='heatmap', showlines=False),
+        visible=visible
+    )
+
+
+# bounded LRU cache of the serialized figures; the key holds everything the figure depends on (e.g. the artifact
+# signature and the figure parameters), so an entry never has to be invalidated
+class FigureCache:
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self.figures = OrderedDict()
+
+    def get(self, key, build) -> dict:
+        """
+        build: called on a miss, returns the go.Figure; it's serialized once and kept as a plain dict
+        """
+        if key in self.figures:
+            self.figures.move_to_end(key)
+            return self.figures[key]
+
+        figure = json.loads(pio.to_json(build(), validate=False))
+        self.figures[key] = figure
+        while len(self.figures) > self.max_size:
+            self.figures.popitem(last=False)  # evicts the least recently used figure
+        return figure
+
+
+def _cycle(values: list):
+    while True:
+        yield from values
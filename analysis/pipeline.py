@@ -0,0 +1,200 @@
+from logger import Logger
+from cleaning import DataCleaning, RAW_TYPES, READ_COLUMNS
+from clustering import final_data
+from glob import glob
+from datetime import datetime
+import pandas as pd
+import hashlib
+import time
+import json
+import os
+
+# bumped whenever the code of a stage changes what it outputs; the cached outputs of older versions are never hit again
+CACHE_VERSION = 1
+
+STAGES = ['first', 'second', 'third', 'clusters']
+
+
+# outputs of the pipeline stages on disk (one parquet file and one json file per output), keyed by a hash of the inputs and
+# parameters of the stage; the last max_entries outputs of each stage are kept, so going back to earlier parameters is a hit
+class StageCache:
+    def __init__(self, path: str, max_entries: int = 4):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(stage: str, *parts) -> str:
+        return hashlib.sha1(json.dumps([CACHE_VERSION, stage, *parts]).encode()).hexdigest()
+
+    def meta(self, stage: str, key: str):
+        # the json file of a cached output (stage, key, time it took...), or None
+        path = self._path(stage, key) + '.json'
+        if not os.path.exists(path) or not os.path.exists(self._path(stage, key) + '.parquet'):
+            return None
+
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def load(self, stage: str, key: str) -> pd.DataFrame:
+        os.utime(self._path(stage, key) + '.json')  # marks it as recently used
+        return pd.read_parquet(self._path(stage, key) + '.parquet')
+
+    def save(self, stage: str, key: str, df: pd.DataFrame, meta: dict):
+        # the parquet file is written first and the json file last (then renamed), so a half-written output is never a hit
+        path = self._path(stage, key)
+        df.to_parquet(path + '.parquet', index=False)
+        with open(path + '.json.tmp', 'w') as f:
+            json.dump({'stage': stage, 'key': key, 'rows': len(df), 'created_at': datetime.now().isoformat(timespec='seconds'), **meta}, f)
+        os.replace(path + '.json.tmp', path + '.json')
+        self._prune(stage)
+
+    def _prune(self, stage: str):
+        entries = sorted(glob(os.path.join(self.path, f'{stage}_*.json')), key=os.path.getmtime, reverse=True)
+        for entry in entries[self.max_entries:]:
+            for path in (entry, entry[:-len('.json')] + '.parquet'):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.path, f'{stage}_{key[:16]}')
+
+
+def file_manifest(files: list, memo_path: str) -> str:
+    """
+    Hash of the names and contents of the match files. The content hash of each file is remembered with its size and mtime
+    (memo_path), so only the new or changed files are read; a file rewritten with the same content doesn't change the hash.
+    """
+    memo = {}
+    if os.path.exists(memo_path):
+        with open(memo_path, 'r') as f:
+            memo = json.load(f)
+
+    digest = hashlib.sha1()
+    hashes = {}
+    for file in files:
+        name, stat = os.path.basename(file), os.stat(file)
+        entry = memo.get(name)
+        if entry is None or entry[:2] != [stat.st_size, stat.st_mtime]:
+            with open(file, 'rb') as f:
+                entry = [stat.st_size, stat.st_mtime, hashlib.sha1(f.read()).hexdigest()]
+        hashes[name] = entry
+        digest.update(f'{name}:{entry[2]}\n'.encode())
+
+    if hashes != memo:
+        tmp_path = memo_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(hashes, f)
+        os.replace(tmp_path, memo_path)
+    return digest.hexdigest()
+
+
+# runs first stage > second stage > third stage > clusters (k-means and PCA) with every output cached. The key of a stage is
+# the hash of its own parameters and of the key of the stage before it (the first one starts from the file manifest), so a
+# change only re-runs the stages from the one it affects; the run starts from the last stage that is already cached
+class PipelineRunner:
+    def __init__(self, logger: Logger, filepath: str, cache_path: str, threshold_matches: int = 50, n_clusters: int = 4,
+                 n_components: int = 2, random_state: int = 42, store_path: str = None):
+        """
+        cache_path: folder of the cached stage outputs
+        store_path: if set, a first stage that is not cached is read through the columnar store (only the new files are parsed)
+        """
+        self.logger = logger
+        self.cache = StageCache(cache_path)
+        self.data_cleaning = DataCleaning(logger, filepath, threshold_matches=threshold_matches, verbose=False, store_path=store_path)
+
+        # the first stage only reads READ_COLUMNS (drop_columns never matches any of them), so its output depends on the files alone
+        self.params = {
+            'first': {'read_columns': sorted(READ_COLUMNS)},
+            'second': {'keep_columns': self.data_cleaning.keep_columns},
+            'third': {'threshold_matches': threshold_matches},
+            'clusters': {'n_clusters': n_clusters, 'n_components': n_components, 'random_state': random_state}
+        }
+        self.report = []
+
+    def keys(self):
+        # key of each stage, or None if there are no match files
+        files = self.data_cleaning._list_files()
+        if files is None:
+            return
+
+        with self.logger.span('manifest'):
+            key = file_manifest(files, os.path.join(self.cache.path, 'manifest.json'))
+        keys = {}
+        for stage in STAGES:
+            key = keys[stage] = StageCache.key(stage, key, self.params[stage])
+        return keys
+
+    def run(self, until: str = 'clusters') -> pd.DataFrame:
+        """
+        Output of the stage until (by default the clusters with the PCA coordinates); self.report gets one row per stage:
+        'hit' (loaded from the cache), 'run' (computed) or 'not needed' (a later stage was cached), with the seconds spent
+        and the seconds saved (what computing the stages up to a hit took when it was cached, minus the loading time).
+        """
+        keys = self.keys()
+        if keys is None:
+            return
+
+        stages = STAGES[:STAGES.index(until) + 1]
+        self.report = []
+
+        # the last stage already cached; the ones before it are not needed
+        start, df, elapsed = 0, None, 0.0  # elapsed: what computing the output so far from scratch takes
+        for index in reversed(range(len(stages))):
+            meta = self.cache.meta(stages[index], keys[stages[index]])
+            if meta is None:
+                continue
+
+            begin = time.perf_counter()
+            df = self._restore(stages[index], self.cache.load(stages[index], keys[stages[index]]))
+            seconds = time.perf_counter() - begin
+            elapsed = meta['elapsed']
+            self.report += [self._row(stage, 'not needed', 0.0, 0.0) for stage in stages[:index]]
+            self.report.append(self._row(stages[index], 'hit', seconds, elapsed - seconds))
+            self.logger.log(f'{stages[index]} stage: cache hit ({meta["rows"]} rows)')
+            self.logger.count('stage_cache_hits')
+            start = index + 1
+            break
+
+        for stage in stages[start:]:
+            self.logger.log(f'{stage} stage: running...')
+            begin = time.perf_counter()
+            df = self._compute(stage, df)
+            if df is None:
+                return
+            seconds = time.perf_counter() - begin
+            elapsed += seconds
+            self.cache.save(stage, keys[stage], df, {'params': self.params[stage], 'seconds': seconds, 'elapsed': elapsed})
+            self.report.append(self._row(stage, 'run', seconds, 0.0))
+            self.logger.count('stage_cache_misses')
+
+        return df
+
+    def report_df(self) -> pd.DataFrame:
+        return pd.DataFrame(self.report, columns=['stage', 'status', 'seconds', 'saved'])
+
+    def _compute(self, stage: str, df: pd.DataFrame):
+        if stage == 'first':
+            with self.logger.span('read'):
+                return self.data_cleaning._first_stage_df()
+        if stage == 'second':
+            return self.data_cleaning._timed_parse(df)
+        if stage == 'third':
+            return self.data_cleaning._player_means(df)
+
+        params = self.params['clusters']
+        return final_data(df, self.logger, n_clusters=params['n_clusters'], n_components=params['n_components'],
+                          random_state=params['random_state'])
+
+    @staticmethod
+    def _restore(stage: str, df: pd.DataFrame) -> pd.DataFrame:
+        # parquet gives back the arrow strings with another (equivalent) dtype; the compact types are applied again
+        if stage == 'first':
+            return DataCleaning._compact(df, RAW_TYPES)
+        if stage == 'second':
+            return DataCleaning._compact(df)
+        return df
+
+    @staticmethod
+    def _row(stage: str, status: str, seconds: float, saved: float) -> dict:
+        return {'stage': stage, 'status': status, 'seconds': seconds, 'saved': max(saved, 0.0)}
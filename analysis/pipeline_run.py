@@ -0,0 +1,34 @@
+from pipeline import PipelineRunner, STAGES
+from dotenv import load_dotenv
+import argparse
+import os
+from logger import Logger
+
+
+load_dotenv()
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--threshold-matches', type=int, default=50, help='minimum matches of a player to be clustered')
+parser.add_argument('--clusters', type=int, default=4)
+parser.add_argument('--components', type=int, default=2, help='PCA components')
+parser.add_argument('--random-state', type=int, default=42)
+parser.add_argument('--until', choices=STAGES, default='clusters', help='last stage to run')
+parser.add_argument('--output', type=str, default=None, help='parquet file for the output of the last stage')
+parser.add_argument('--metrics', type=str, default=None, help='json lines file for the timing spans and counters of the run')
+args = parser.parse_args()
+
+
+filepath = os.getenv('FILEPATH')
+store_path = os.getenv('STORE_PATH', os.path.join(filepath, 'store'))
+
+logger = Logger(metrics=args.metrics is not None, metrics_path=args.metrics)
+runner = PipelineRunner(logger, filepath, os.path.join(store_path, 'stages'), threshold_matches=args.threshold_matches,
+                        n_clusters=args.clusters, n_components=args.components, random_state=args.random_state, store_path=store_path)
+df = runner.run(until=args.until)
+if df is not None and args.output:
+    df.to_parquet(args.output, index=False)
+
+report = runner.report_df()
+logger.log(f'\n{report.to_string(index=False, float_format=lambda value: f"{value:.2f}")}')
+logger.log(f"{(report['status'] == 'hit').sum()} cache hit(s), {report['saved'].sum():.2f} s saved")
+logger.log_summary()
@@ -0,0 +1,70 @@
+from sklearn.preprocessing import StandardScaler
+from sklearn.neighbors import KDTree
+import numpy as np
+import pandas as pd
+
+
+# "players most like X": nearest neighbours over the scaled per-player features in a KD-tree; with a handful of features
+# a query only visits a few leaves, so it takes microseconds instead of a pass over every player
+class SimilarityIndex:
+    def __init__(self, features: pd.DataFrame, leaf_size: int = 16):
+        """
+        features: one row per player, as returned by third_stage_df; scaled like scale_features (float64/int64 columns)
+        """
+        features_x = features.select_dtypes(include=['float64', 'int64'])
+        self.columns = list(features_x.columns)
+        self.x = StandardScaler().fit_transform(features_x)
+        self.players = features['players'].astype(str).to_numpy()
+        self.rows = {player: row for row, player in enumerate(self.players)}
+        self.tree = KDTree(self.x, leaf_size=leaf_size)
+
+    def __len__(self):
+        return len(self.players)
+
+    def __contains__(self, player: str):
+        return player in self.rows
+
+    def similar(self, player: str, k: int = 10) -> pd.DataFrame:
+        # the k players closest to player (the player itself excluded), closest first
+        neighbours, distances = self._query([self._row(player)], k)
+        return pd.DataFrame({'rank': np.arange(1, neighbours.shape[1] + 1), 'player': self.players[neighbours[0]], 'distance': distances[0]})
+
+    def similar_batch(self, players: list, k: int = 10) -> pd.DataFrame:
+        """
+        The k closest players of each player in players, in a single query of the tree.
+        Returns one row per (query, neighbour): query, rank (1 = closest), player, distance.
+        """
+        rows = np.array([self._row(player) for player in players], dtype=np.intp)
+        neighbours, distances = self._query(rows, k)
+        k = neighbours.shape[1]
+
+        return pd.DataFrame({
+            'query': np.repeat(self.players[rows], k),
+            'rank': np.tile(np.arange(1, k + 1), len(rows)),
+            'player': self.players[neighbours.ravel()],
+            'distance': distances.ravel()
+        })
+
+    def closest_to(self, players: list, k: int = 10) -> pd.DataFrame:
+        """
+        The k players closest to the centroid of players (e.g. the members of a cluster, for the most typical players of a role).
+        Returns player, distance.
+        """
+        centroid = self.x[[self._row(player) for player in players]].mean(axis=0)
+        distances, neighbours = self.tree.query(centroid[None, :], k=min(k, len(self)))
+        return pd.DataFrame({'player': self.players[neighbours[0]], 'distance': distances[0]})
+
+    def _query(self, rows, k: int):
+        rows = np.asarray(rows, dtype=np.intp)
+        k = min(k, len(self) - 1)
+        distances, neighbours = self.tree.query(self.x[rows], k=k + 1)
+
+        # drops each player from the player's own neighbour list; if ties with identical players pushed the player out of that list, the last neighbour goes instead
+        own = neighbours == rows[:, None]
+        own[~own.any(axis=1), -1] = True
+        return neighbours[~own].reshape(len(rows), k), distances[~own].reshape(len(rows), k)
+
+    def _row(self, player: str) -> int:
+        if player not in self.rows:
+            raise KeyError(f'Unknown player: {player}')
+        return self.rows[player]
@@ -0,0 +1,110 @@
+from logger import Logger
+from sklearn.cluster import KMeans
+from scipy.optimize import linear_sum_assignment
+from threadpoolctl import threadpool_limits
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import pandas as pd
+import hashlib
+import os
+
+
+# how much the clusters of assign_clusters depend on the sample and the seed: k-means is refitted on many bootstrap
+# resamples, the labels of every run are matched to the reference clustering (Hungarian algorithm), and each player gets the
+# share of runs that agree with the player's label
+class StabilityResult:
+    def __init__(self, reference: np.ndarray, runs: np.ndarray, n_clusters: int):
+        self.reference = reference  # labels of the full fit (same as assign_clusters)
+        self.runs = runs  # aligned labels, one row per run and one column per player
+        self.n_clusters = n_clusters
+
+    @property
+    def probabilities(self) -> np.ndarray:
+        # share of the runs that put each player in each cluster (players x clusters)
+        n_runs, n_players = self.runs.shape
+        codes = self.runs + np.arange(n_players) * self.n_clusters
+        return np.bincount(codes.ravel(), minlength=n_players * self.n_clusters).reshape(n_players, self.n_clusters) / n_runs
+
+    @property
+    def confidence(self) -> np.ndarray:
+        # share of the runs that agree with the reference label of each player
+        return self.probabilities[np.arange(len(self.reference)), self.reference]
+
+    def co_assignment(self) -> np.ndarray:
+        """
+        Share of the runs in which two players were in the same cluster (players x players). Doesn't depend on the alignment;
+        computed as one matrix product of the one-hot labels of all the runs, so it takes players^2 memory.
+        """
+        n_runs, n_players = self.runs.shape
+        one_hot = np.zeros((n_players, n_runs * self.n_clusters), dtype=np.float32)
+        one_hot[np.arange(n_players)[None, :], self.runs + np.arange(n_runs)[:, None] * self.n_clusters] = 1
+        return one_hot @ one_hot.T / n_runs
+
+    def to_frame(self, players) -> pd.DataFrame:
+        return pd.DataFrame({'player': np.asarray(players), 'cluster': self.reference, 'confidence': self.confidence})
+
+
+def cluster_stability(x, logger: Logger, n_clusters: int, n_runs: int = 200, n_jobs: int = None, random_state=42,
+                      cache_dir: str = None) -> StabilityResult:
+    """
+    x: the scaled features (scale_features)
+    n_runs: bootstrap resamples; each one also gets its own seed
+    n_jobs: processes running the resamples (None uses all cores)
+    The runs are saved in cache_dir (if given), keyed by the data and the parameters.
+    """
+    x = np.ascontiguousarray(x)
+    reference = KMeans(n_clusters=n_clusters, random_state=random_state).fit_predict(x)
+
+    cache_file = None
+    if cache_dir is not None:
+        key = hashlib.sha1(x.tobytes() + repr((n_clusters, n_runs, random_state)).encode()).hexdigest()
+        cache_file = os.path.join(cache_dir, f'stability_{key}.npy')
+        if os.path.exists(cache_file):
+            logger.count('stability_cache_hits')
+            return StabilityResult(reference, np.load(cache_file), n_clusters)
+
+    n_jobs = n_jobs or os.cpu_count()
+    # one task per worker, so x is sent to each process only once
+    seeds = np.array_split(np.random.SeedSequence(random_state).generate_state(n_runs), n_jobs)
+    logger.log(f'Running {n_runs} bootstrap resamples ({n_clusters} clusters, {n_jobs} processes)...')
+    with logger.span('stability'):
+        args = (repeat(x), repeat(reference), repeat(n_clusters), seeds, repeat(n_jobs > 1))
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                runs = np.concatenate(list(executor.map(_bootstrap_runs, *args)))
+        else:
+            runs = np.concatenate(list(map(_bootstrap_runs, *args)))
+
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(cache_file, runs)
+    return StabilityResult(reference, runs, n_clusters)
+
+
+def align_labels(labels: np.ndarray, reference: np.ndarray, n_clusters: int) -> np.ndarray:
+    # renames the clusters of labels to the reference cluster they share the most players with (Hungarian algorithm)
+    return label_mapping(labels, reference, n_clusters)[labels]
+
+
+def label_mapping(labels: np.ndarray, reference: np.ndarray, n_clusters: int) -> np.ndarray:
+    # mapping[cluster of labels] = reference cluster; labels and reference are the clusters of the same players, e.g. the
+    # players two clusterings have in common (the mapping then renames all the players of the first one)
+    overlap = np.bincount(labels * n_clusters + reference, minlength=n_clusters * n_clusters).reshape(n_clusters, n_clusters)
+    rows, cols = linear_sum_assignment(overlap, maximize=True)
+    mapping = np.empty(n_clusters, dtype=labels.dtype)
+    mapping[rows] = cols
+    return mapping
+
+
+def _bootstrap_runs(x: np.ndarray, reference: np.ndarray, n_clusters: int, seeds: np.ndarray, single_thread: bool) -> np.ndarray:
+    # with several processes, each one keeps k-means on a single thread instead of competing for the cores
+    with threadpool_limits(1 if single_thread else None):
+        runs = np.empty((len(seeds), len(x)), dtype=np.int8)
+        for run, seed in enumerate(seeds):
+            rng = np.random.default_rng(seed)
+            sample = rng.integers(0, len(x), len(x))
+            model = KMeans(n_clusters=n_clusters, random_state=int(seed)).fit(x[sample])
+            # every player is labeled in every run, including the ones left out of the resample
+            runs[run] = align_labels(model.predict(x), reference, n_clusters)
+    return runs
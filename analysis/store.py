@@ -0,0 +1,166 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from logger import Logger
+import json
+import os
+
+
+# consolidated columnar copy of the scraped match files; each ingest run appends one parquet batch with the new or changed matches
+class MatchStore:
+    def __init__(self, logger: Logger, store_path: str, max_batches: int = 64):
+        self.logger = logger
+        self.store_path = store_path
+        self.batches_path = os.path.join(store_path, 'batches')
+        self.manifest_path = os.path.join(store_path, 'manifest.json')
+        self.max_batches = max_batches
+        self.invalidated = False  # set by ingest when rows that were already stored got replaced or removed
+
+        os.makedirs(self.batches_path, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def ingest(self, files: list, reader) -> pd.DataFrame:
+        """
+        Appends the files that are new or changed (size/mtime) since the last ingest.
+        reader(files, first_match) must return the first stage dataframe of those files, numbering the matches from first_match.
+        Returns the rows that were added.
+        """
+        known = self.manifest['files']
+        stats = {os.path.basename(file): os.stat(file) for file in files}
+
+        pending = [
+            file for file in files
+            if self._signature(stats[os.path.basename(file)]) != self._signature_of(known.get(os.path.basename(file)))
+        ]
+        removed = set(known) - set(stats)
+        self.invalidated = bool(removed) or any(os.path.basename(file) in known for file in pending)
+
+        for name in removed:
+            del known[name]
+
+        if not pending:
+            if removed:
+                self._save_manifest()
+            self.logger.log(f'Store is up to date ({len(known)} matches)')
+            return pd.DataFrame()
+
+        first_match = self.manifest['next_match']
+        self.logger.log(f'Ingesting {len(pending)} new or changed matches into the store...')
+        df = reader(pending, first_match)
+
+        batch = f"batch_{self.manifest['next_batch']:05d}.parquet"
+        df.to_parquet(os.path.join(self.batches_path, batch), index=False)
+
+        for match_number, file in enumerate(pending, start=first_match):
+            stat = stats[os.path.basename(file)]
+            known[os.path.basename(file)] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'match': match_number}
+
+        self.manifest['batches'].append(batch)
+        self.manifest['next_batch'] += 1
+        self.manifest['next_match'] = first_match + len(pending)
+        self._save_manifest()
+
+        if len(self.manifest['batches']) > self.max_batches:
+            self.compact()
+
+        return df
+
+    def load(self) -> pd.DataFrame:
+        if not self.manifest['batches']:
+            return pd.DataFrame()
+
+        # the batches are joined and filtered as arrow tables, so the stale rows and the per-batch frames are never built in pandas
+        tables = [pq.read_table(os.path.join(self.batches_path, batch)) for batch in self.manifest['batches']]
+        schema = self._union_schema([table.schema for table in tables])
+        table = pa.concat_tables([table if table.schema.equals(schema) else self._conform(table, schema) for table in tables])
+
+        # rows from changed or deleted files are left behind in older batches; keep only the current version of each match
+        live_matches = pa.array([entry['match'] for entry in self.manifest['files'].values()], type=schema.field('match').type)
+        return table.filter(pc.is_in(table['match'], value_set=live_matches)).to_pandas()
+
+    def iter_batches(self, chunk_rows: int = 100_000):
+        """
+        Same rows as load(), read chunk_rows at a time, so the memory doesn't grow with the size of the store.
+        """
+        if not self.manifest['batches']:
+            return
+
+        paths = [os.path.join(self.batches_path, batch) for batch in self.manifest['batches']]
+        schema = self._union_schema([pq.read_schema(path) for path in paths])  # from the file footers, no rows are read
+        live_matches = pa.array([entry['match'] for entry in self.manifest['files'].values()])
+        for path in paths:
+            parquet_file = pq.ParquetFile(path)
+            value_set = live_matches.cast(parquet_file.schema_arrow.field('match').type)
+            for record_batch in parquet_file.iter_batches(batch_size=chunk_rows):
+                table = pa.Table.from_batches([record_batch])
+                table = table.filter(pc.is_in(table['match'], value_set=value_set))
+                if table.num_rows > 0:
+                    yield (table if table.schema.equals(schema) else self._conform(table, schema)).to_pandas()
+
+    def compact(self):
+        """
+        Rewrites all the live rows into a single batch, dropping stale rows and old batch files.
+        """
+        self.logger.log(f"Compacting store ({len(self.manifest['batches'])} batches)...")
+        df = self.load()
+        old_batches = self.manifest['batches']
+
+        batch = f"batch_{self.manifest['next_batch']:05d}.parquet"
+        df.to_parquet(os.path.join(self.batches_path, batch), index=False)
+        self.manifest['batches'] = [batch]
+        self.manifest['next_batch'] += 1
+        self._save_manifest()
+
+        for old_batch in old_batches:
+            os.remove(os.path.join(self.batches_path, old_batch))
+
+    @staticmethod
+    def _union_schema(schemas: list) -> pa.Schema:
+        # the columns of every batch, with the types of the newest batch that has them; a column missing from the newest
+        # batch (e.g. a file ingested without the date and event) is kept for the older batches
+        fields = {}
+        for schema in reversed(schemas):
+            for field in schema:
+                fields.setdefault(field.name, field)
+        return pa.schema(list(fields.values()), metadata=schemas[-1].metadata if schemas else None)
+
+    @staticmethod
+    def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+        # batches written by older versions may have other columns or types; they are read in the layout of the union schema
+        columns = []
+        for field in schema:
+            if field.name not in table.column_names:
+                columns.append(pa.nulls(len(table), field.type))  # e.g. the date and event of the matches ingested before they were scraped
+                continue
+            column = table[field.name]
+            if pa.types.is_dictionary(field.type) and not pa.types.is_dictionary(column.type):
+                column = pc.dictionary_encode(column)  # plain strings can't be cast to a dictionary directly
+            columns.append(column.cast(field.type))
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def version(self) -> list:
+        # changes whenever matches are added, replaced or removed
+        return [self.manifest['next_match'], len(self.manifest['files'])]
+
+    @staticmethod
+    def _signature(stat: os.stat_result):
+        return stat.st_size, stat.st_mtime
+
+    @staticmethod
+    def _signature_of(entry: dict):
+        return None if entry is None else (entry['size'], entry['mtime'])
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'files': {}, 'batches': [], 'next_batch': 0, 'next_match': 0}
+
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def _save_manifest(self):
+        # write then rename, so an interrupted run never leaves a half-written manifest behind
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+
+# per-match rows indexed by date and by player: the rows are kept sorted by date (range queries are two binary searches)
+# with a second order by player then date (the matches of one player are a contiguous slice); the rolling windows slide
+# over the date order, adding the rows that enter the window and subtracting the ones that leave it
+class PlayerTimeline:
+    def __init__(self, df: pd.DataFrame, features: list):
+        """
+        df: per-match rows with the players, the features and the date (DataCleaning.timeline_df)
+        features: the columns averaged per player (e.g. keep_columns[1:])
+        """
+        df = df.sort_values('date', kind='stable', ignore_index=True)
+        self.df = df
+        self.features = list(features)
+        self.dates = df['date'].to_numpy(dtype='datetime64[ns]')
+        # missing values are summed as 0 and left out of the per-feature counts (same as the groupby means, which skip them);
+        # a NaN weight would otherwise stay in the running sums of the player for every later window
+        x = df[self.features].to_numpy(dtype='float64')
+        self.valid = ~np.isnan(x)
+        self.x = np.where(self.valid, x, 0.0)
+
+        players = df['players'].astype('category')
+        self.players = players.cat.categories.astype(str).to_numpy()
+        self.codes = players.cat.codes.to_numpy()
+
+        # rows sorted by player then date (a stable sort of the date order), and where the rows of each player start in that order
+        self.player_order = np.argsort(self.codes, kind='stable')
+        self.player_offsets = np.searchsorted(self.codes[self.player_order], np.arange(len(self.players) + 1))
+        self.player_codes = {player: code for code, player in enumerate(self.players)}
+
+    @classmethod
+    def from_cleaning(cls, data_cleaning):
+        return cls(data_cleaning.timeline_df(), data_cleaning.keep_columns[1:])
+
+    def __len__(self):
+        return len(self.df)
+
+    def range(self, start=None, end=None) -> pd.DataFrame:
+        # the rows with start <= date < end
+        lo, hi = self._bounds(self.dates, start, end)
+        return self.df.iloc[lo:hi]
+
+    def player_range(self, player: str, start=None, end=None) -> pd.DataFrame:
+        # the matches of one player with start <= date < end, oldest first
+        if player not in self.player_codes:
+            raise KeyError(f'Unknown player: {player}')
+        code = self.player_codes[player]
+        rows = self.player_order[self.player_offsets[code]:self.player_offsets[code + 1]]
+        lo, hi = self._bounds(self.dates[rows], start, end)
+        return self.df.iloc[rows[lo:hi]]
+
+    def window_means(self, end, days: int = 90, min_matches: int = 1) -> pd.DataFrame:
+        # per-player means over the days before end (same layout as third_stage_df)
+        end = pd.Timestamp(end)
+        lo, hi = self._bounds(self.dates, end - pd.Timedelta(days=days), end)
+        counts = np.bincount(self.codes[lo:hi], minlength=len(self.players))
+        return self._means(self._sums(lo, hi, self.x), self._sums(lo, hi, self.valid), counts, min_matches)
+
+    def rolling(self, days: int = 90, step_days: int = 30, start=None, end=None, min_matches: int = 1):
+        """
+        Per-player means over a window of days, sliding by step_days from start (by default the first date + days) to end
+        (by default the last date); yields (window end, means). Each step only touches the rows that entered or left the window.
+        """
+        if len(self) == 0:
+            return
+        window, step = pd.Timedelta(days=days), pd.Timedelta(days=step_days)
+        window_end = pd.Timestamp(start) if start is not None else pd.Timestamp(self.dates[0]) + window
+        last = pd.Timestamp(end) if end is not None else pd.Timestamp(self.dates[-1]).floor('D') + pd.Timedelta(days=1)
+
+        sums = np.zeros((len(self.players), len(self.features)))
+        value_counts = np.zeros((len(self.players), len(self.features)))  # non-missing values per player and feature
+        counts = np.zeros(len(self.players), dtype=np.int64)
+        lo = hi = 0
+        while True:
+            new_lo, new_hi = self._bounds(self.dates, window_end - window, window_end)
+            if new_lo >= hi:  # no overlap with the previous window (a step longer than the window), starts from scratch
+                sums[:], value_counts[:], counts[:] = 0, 0, 0
+                lo = hi = new_lo
+
+            # subtracts the rows that left the window and adds the ones that entered it
+            sums -= self._sums(lo, new_lo, self.x)
+            value_counts -= self._sums(lo, new_lo, self.valid)
+            counts -= np.bincount(self.codes[lo:new_lo], minlength=len(self.players))
+            sums += self._sums(hi, new_hi, self.x)
+            value_counts += self._sums(hi, new_hi, self.valid)
+            counts += np.bincount(self.codes[hi:new_hi], minlength=len(self.players))
+            lo, hi = new_lo, new_hi
+
+            yield window_end, self._means(sums, value_counts, counts, min_matches)
+            if window_end >= last:
+                return
+            window_end = min(window_end + step, last)
+
+    def _sums(self, lo: int, hi: int, values: np.ndarray) -> np.ndarray:
+        # per-player sums of the columns of values (self.x, or self.valid for the counts) over the rows lo..hi (date order)
+        codes = self.codes[lo:hi]
+        return np.column_stack([np.bincount(codes, weights=values[lo:hi, i], minlength=len(self.players)) for i in range(len(self.features))])
+
+    def _means(self, sums: np.ndarray, value_counts: np.ndarray, counts: np.ndarray, min_matches: int) -> pd.DataFrame:
+        # min_matches counts the matches of the player; a feature with no value in the window is NaN, like in the groupby
+        keep = counts >= max(min_matches, 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.where(value_counts[keep] > 0, sums[keep] / value_counts[keep], np.nan)
+        means = pd.DataFrame(values, columns=self.features)
+        means.insert(0, 'players', self.players[keep])
+        return means
+
+    @staticmethod
+    def _bounds(dates: np.ndarray, start, end):
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end), 'ns'), side='left')
+        return lo, max(lo, hi)
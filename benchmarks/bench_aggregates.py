@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import pandas as pd
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from aggregates import PlayerAggregates
+from cleaning import DataCleaning
+from logger import Logger, WARNING
+from synthetic import write_match_files
+
+EXAMPLE_DATA = os.path.join(os.path.dirname(__file__), '..', 'assets', 'example_data')
+
+
+def check(logger: Logger, filepath: str, store_path: str, threshold: int, step: str, rtol: float):
+    # the persisted aggregates (store) against the batch groupby over every file; fails if the means or stds differ
+    start = time.perf_counter()
+    incremental = DataCleaning(logger, filepath, threshold_matches=threshold, verbose=False, store_path=store_path).third_stage_df()
+    t_incremental = time.perf_counter() - start
+
+    data_cleaning = DataCleaning(logger, filepath, threshold_matches=threshold, verbose=False)
+    start = time.perf_counter()
+    df = data_cleaning._second_stage_df()
+    batch = data_cleaning._player_means(df)
+    t_batch = time.perf_counter() - start
+    pd.testing.assert_frame_equal(incremental, batch, check_exact=False, rtol=rtol)
+
+    # the stds of the state against groupby().std() on the same players
+    aggregates = PlayerAggregates.load(os.path.join(store_path, 'player_state.parquet'))
+    stds = df.groupby('players', observed=True)[aggregates.features].std().astype('float64')
+    stds.index = stds.index.astype(str)
+    stds = stds.loc[batch['players']].rename_axis('players').reset_index()
+    pd.testing.assert_frame_equal(aggregates.stds(threshold), stds, check_exact=False, rtol=1e-6, atol=1e-9)
+
+    print(f'{step:<24} | {len(batch):>7} | {t_incremental:>8.2f} | {t_batch:>7.2f} | ok')
+
+
+def main(n_matches: int, n_players: int, n_added: int, rtol: float):
+    logger = Logger(background=False, level=WARNING)
+    print(f"{'step':<24} | {'players':>7} | {'store s':>8} | {'batch s':>7} | means and stds")
+    with tempfile.TemporaryDirectory() as folder:
+        # the example files of the repo (real HLTV matches), every player kept
+        filepath, store_path = os.path.join(folder, 'example'), os.path.join(folder, 'example_store')
+        shutil.copytree(EXAMPLE_DATA, filepath)
+        check(logger, filepath, store_path, 1, 'example data', rtol)
+
+        # synthetic folder: first run, new matches folded in, a no-op run, a deleted and a rewritten match (rebuilds)
+        filepath, store_path = os.path.join(folder, 'synthetic'), os.path.join(folder, 'synthetic_store')
+        write_match_files(filepath, n_matches, n_players=n_players)
+        check(logger, filepath, store_path, 10, 'first run', rtol)
+
+        files = sorted(os.listdir(filepath))
+        for idx, file in enumerate(files[:n_added]):
+            shutil.copy(os.path.join(filepath, file), os.path.join(filepath, f'match_9{idx:06d}.csv'))
+        check(logger, filepath, store_path, 10, f'{n_added} matches added', rtol)
+        check(logger, filepath, store_path, 10, 'no new matches', rtol)
+
+        os.remove(os.path.join(filepath, files[0]))
+        check(logger, filepath, store_path, 10, 'match deleted', rtol)
+
+        shutil.copy(os.path.join(filepath, files[2]), os.path.join(filepath, files[1]))
+        check(logger, filepath, store_path, 10, 'match rewritten', rtol)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=2000)
+    parser.add_argument('--players', type=int, default=300)
+    parser.add_argument('--added', type=int, default=100)
+    # the batch groupby averages the float32 columns in float32, the aggregates sum them in float64
+    parser.add_argument('--rtol', type=float, default=1e-6, help='tolerance of the incremental means against the batch ones')
+    args = parser.parse_args()
+    main(args.matches, args.players, args.added, args.rtol)
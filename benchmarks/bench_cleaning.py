@@ -0,0 +1,74 @@
+import os
+import re
+import sys
+import time
+import pandas as pd
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from cleaning import DataCleaning
+from logger import Logger
+from synthetic import synthetic_rows
+
+
+# row-by-row parsing, as it was done before the vectorized path; kept here only as the reference for parity and speed
+def legacy_second_stage(df: pd.DataFrame, keep_columns: list):
+    def modify_perc(value):
+        return float(re.sub(r'\+|-|%', '', value)) / 100
+
+    def modify_kad_exclude(value):
+        return int(re.sub(r'\(\d+\)', '', value))
+
+    def modify_kad(value):
+        groups = re.search(r'(\d+)\((\d+)', value)
+        g1, g2 = int(groups.group(1)), int(groups.group(2))
+        return (g2 / g1) if g1 != 0 else 0
+
+    df = df.copy()
+    for col in ['K(hs)', 'A(f)', 'D(t)']:
+        if col != 'A(f)':
+            df[re.search(r'\(([a-z]+)\)', col).group(1)] = df[col].apply(modify_kad)
+        df[re.sub(r'\([a-z]+\)', '', col)] = df[col].apply(modify_kad_exclude)
+
+    df[['opk', 'opd']] = df['Op.K-D'].str.split(' : ', n=1, expand=True).astype(int)
+    df['opk'] = df.apply(lambda r: r['opk'] / r['K'] if r['K'] != 0 else 0, axis=1)
+    df['opd'] = df.apply(lambda r: r['opd'] / r['D'] if r['D'] != 0 else 0, axis=1)
+    df['KAST'] = df['KAST'].apply(modify_perc)
+    df['Swing'] = df['Swing'].apply(modify_perc)
+    return df[keep_columns]
+
+
+class InMemoryCleaning(DataCleaning):
+    def __init__(self, df: pd.DataFrame):
+        super().__init__(Logger(), filepath='', verbose=False)
+        self.df = df
+
+    def _first_stage_df(self):
+        return self.df
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(sizes=(10_000, 100_000, 1_000_000), skip_legacy_above=1_000_000):
+    print(f"{'rows':>10} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>8}")
+    for n_rows in sizes:
+        df = synthetic_rows(n_rows)
+        dc = InMemoryCleaning(df)
+        new, t_new = timed(dc._second_stage_df)
+
+        if n_rows > skip_legacy_above:
+            print(f'{n_rows:>10} {"-":>12} {t_new:>15.3f} {"-":>8}')
+            continue
+
+        old, t_old = timed(lambda: legacy_second_stage(df, dc.keep_columns))
+        # parity with the row-by-row output, up to the compact types (category names, float32 stats)
+        pd.testing.assert_frame_equal(old, new.astype(old.dtypes.to_dict()), check_exact=False, rtol=1e-6)
+        print(f'{n_rows:>10} {t_old:>12.3f} {t_new:>15.3f} {t_old / t_new:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
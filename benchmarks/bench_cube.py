@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import pandas as pd
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from cleaning import DataCleaning
+from clustering import ClusterCache, cached_final_data
+from logger import Logger, WARNING
+from synthetic import write_match_files
+
+
+# the whole pipeline for one selection, as a filter needed before the cube: read the csv files, parse, filter and average
+def legacy_selection(logger: Logger, filepath: str, threshold: int, teams: list) -> pd.DataFrame:
+    data_cleaning = DataCleaning(logger, filepath, threshold_matches=threshold, verbose=False)
+    df = data_cleaning.cube_df()
+    if teams:
+        df = df[df['team'].isin(teams)]
+    return data_cleaning._player_means(df[data_cleaning.keep_columns])
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(n_matches: int, n_players: int):
+    logger = Logger(background=False, level=WARNING)
+    with tempfile.TemporaryDirectory() as filepath:
+        write_match_files(filepath, n_matches, n_players=n_players)
+        data_cleaning = DataCleaning(logger, filepath, verbose=False)
+        cube, t_build = timed(data_cleaning.aggregate_cube)
+        teams = cube.teams()
+        print(f'{n_matches:,} matches, {n_players} players: cube of {len(cube.cells):,} cells built in {t_build:.2f} s')
+
+        selections = [(50, []), (10, []), (100, []), (20, teams[:10]), (5, teams[:1])]
+        print(f"{'threshold':>9} {'teams':>5} | {'players':>7} | {'pipeline s':>10} | {'cube ms':>7}")
+        for threshold, selected in selections:
+            legacy, t_legacy = timed(lambda: legacy_selection(logger, filepath, threshold, selected))
+            means, t_cube = timed(lambda: cube.means(threshold, teams=selected))
+            pd.testing.assert_frame_equal(means, legacy, check_exact=False, rtol=1e-6)
+            print(f'{threshold:>9} {len(selected) or "all":>5} | {len(means):>7} | {t_legacy:>10.2f} | {t_cube * 1000:>7.1f}')
+
+        # a sweep of the slider: the clustering only runs for the thresholds that change the population
+        cache = ClusterCache()
+        fits = 0
+        start = time.perf_counter()
+        for threshold in range(1, 201, 5):
+            means = cube.means(threshold)
+            if len(means) >= 5:
+                before = len(cache.results)
+                cached_final_data(means, logger, n_clusters=4, n_components=3, cache=cache)
+                fits += len(cache.results) > before
+        print(f'slider sweep (40 thresholds): {fits} clusterings, {time.perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=5000)
+    parser.add_argument('--players', type=int, default=500)
+    args = parser.parse_args()
+    main(args.matches, args.players)
@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import plotly.express as px
+from dash import Patch
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from figures import FigureCache, scatter_figure
+from synthetic import ROLES
+
+ROLE_NAMES = ['Support', 'AWPer', 'Entry Fragger', 'Lurker']
+
+
+# the px.scatter figure used before the WebGL traces and the figure cache; kept here only as the reference
+def legacy_figure(df_plot: pd.DataFrame, n_clusters: int):
+    fig = px.scatter(df_plot, x='PC1', y='PC2', color='role', hover_name='player', title=f'{n_clusters} clusters',
+                     color_discrete_sequence=px.colors.qualitative.Set1)
+    fig.update_xaxes(showgrid=False)
+    fig.update_yaxes(showgrid=False)
+    fig.update_traces(hovertemplate="<b>%{hovertext}</b><extra></extra>")
+    fig.update_layout(xaxis_title=None, yaxis_title=None, legend_title_text='role', plot_bgcolor="#1e1e1e", paper_bgcolor="#1e1e1e",
+                      margin=dict(t=50, b=50), height=700)
+    return fig
+
+
+def clustered_points(n_points: int, seed: int = 42) -> pd.DataFrame:
+    # PCA-like blobs, one per role; the same shape as DashboardArtifact.clustered_df plus the role
+    rng = np.random.default_rng(seed)
+    cluster = rng.integers(0, len(ROLES), n_points)
+    centers = rng.normal(0, 2.5, (len(ROLES), 2))
+    coords = centers[cluster] + rng.normal(0, 1, (n_points, 2))
+    return pd.DataFrame({
+        'PC1': coords[:, 0],
+        'PC2': coords[:, 1],
+        'player': [f'player_{i}' for i in range(n_points)],
+        'cluster': cluster,
+        'role': np.array(ROLE_NAMES)[cluster]
+    })
+
+
+def timed(func, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main(sizes, max_points: int):
+    print(f"{'points':>8} | {'legacy ms':>10} {'legacy KB':>10} | {'new ms':>8} {'new KB':>8} | {'cached ms':>9} | {'toggle B':>9}")
+    for n_points in sizes:
+        df_plot = clustered_points(n_points)
+
+        legacy_json, t_legacy = timed(lambda: pio.to_json(legacy_figure(df_plot, 4), validate=False))
+
+        cache = FigureCache()
+        build = lambda: scatter_figure(df_plot, title='4 clusters', max_points=max_points, show_density=False)
+        _, t_new = timed(lambda: cache.get(('bench', n_points), build))
+        new_json = json.dumps(cache.get(('bench', n_points), build))
+        # a cache hit, plus the serialization dash does for every response
+        _, t_cached = timed(lambda: json.dumps(cache.get(('bench', n_points), build)), repeat=5)
+
+        # what the density button sends, instead of the whole figure
+        patch = Patch()
+        patch['data'][-1]['visible'] = True
+        toggle_bytes = len(json.dumps(patch.to_plotly_json()))
+
+        print(f'{n_points:>8,} | {t_legacy * 1000:>10.0f} {len(legacy_json) / 1024:>10.0f} | {t_new * 1000:>8.0f} {len(new_json) / 1024:>8.0f} | '
+              f'{t_cached * 1000:>9.1f} | {toggle_bytes:>9}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 5_000, 50_000, 500_000])
+    parser.add_argument('--max-points', type=int, default=5000)
+    args = parser.parse_args()
+    main(args.sizes, args.max_points)
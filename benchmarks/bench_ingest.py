@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import pandas as pd
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from cleaning import DataCleaning
+from logger import Logger
+from synthetic import write_match_files
+
+
+def main(n_matches: int, max_workers: int, filepath: str = None):
+    filepath = filepath or os.path.join(tempfile.gettempdir(), f'cs_bench_{n_matches}')
+    if not os.path.isdir(filepath) or len(os.listdir(filepath)) != n_matches:
+        print(f'Writing {n_matches} synthetic match files into {filepath}...')
+        write_match_files(filepath, n_matches)
+
+    reference = None
+    print(f"{'workers':>8} {'time (s)':>10} {'speedup':>8}")
+    for n_workers in range(1, max_workers + 1):
+        dc = DataCleaning(Logger(), filepath, verbose=False, n_workers=n_workers)
+        start = time.perf_counter()
+        df = dc._first_stage_df()
+        elapsed = time.perf_counter() - start
+
+        # the match numbering (and the whole frame) must not depend on the number of workers
+        if reference is None:
+            reference = (df, elapsed)
+        else:
+            pd.testing.assert_frame_equal(reference[0], df)
+        print(f'{n_workers:>8} {elapsed:>10.2f} {reference[1] / elapsed:>7.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--filepath', type=str, default=None)
+    args = parser.parse_args()
+    main(args.matches, args.workers, args.filepath)
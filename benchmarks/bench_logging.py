@@ -0,0 +1,75 @@
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..')]
+
+from logger import Logger
+
+
+# the synchronous Logger.log used before the background writer; kept here only as the reference for speed
+def legacy_log(message: str, use_time: bool = True):
+    if use_time:
+        formatted_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        if re.search(r'^\n', message):
+            new_message = re.sub(r'^\n', '', message)
+            message = f"\n[{formatted_time}] {new_message}"
+        else:
+            message = f'[{formatted_time}] {message}'
+
+    print(message)
+
+
+def run(n_messages: int, target: str):
+    # same message as DataCleaning._read_dataframe, once per "file"
+    filenames = [f'match_{2_000_000 + i}.csv' for i in range(n_messages)]
+    log_path = os.path.join(tempfile.mkdtemp(), 'bench.log')
+
+    if target == 'file':
+        sink = open(log_path, 'a')
+    else:
+        sink = open(os.devnull, 'w')
+
+    cases = {
+        'legacy print': lambda: [legacy_log(f'Opening {filename}...') for filename in filenames],
+        'sync writer': lambda: [sync.log('Opening %s...', filename) for filename in filenames],
+        'background writer': lambda: [background.log('Opening %s...', filename) for filename in filenames],
+        'below level (debug)': lambda: [background.debug('Opening %s...', filename) for filename in filenames],
+    }
+
+    # the loggers write to stdout unless target is file; either way the same sink as the legacy print
+    file_path = log_path if target == 'file' else None
+    with contextlib.redirect_stdout(sink):
+        sync = Logger(background=False, log_path=file_path)
+        background = Logger(log_path=file_path)
+
+        results = {}
+        for name, func in cases.items():
+            start = time.perf_counter()
+            func()
+            caller = time.perf_counter() - start
+            for logger in (sync, background):
+                logger.flush()
+            sink.flush()
+            results[name] = (caller, time.perf_counter() - start)
+
+        sync.close()
+        background.close()
+    sink.close()
+
+    for name, (caller, total) in results.items():
+        print(f'{name:>20}: caller {caller:7.3f}s ({n_messages / caller:>10,.0f} msg/s)   until written {total:7.3f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200_000)
+    parser.add_argument('--target', choices=['devnull', 'file'], default='devnull', help='where the messages are written')
+    args = parser.parse_args()
+    run(args.messages, args.target)
@@ -0,0 +1,141 @@
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import pandas as pd
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'hltv')]
+
+import page_parser
+from mock_server import results_page, match_page, stats_page
+
+
+# the BeautifulSoup('html.parser') parsing used before page_parser moved to lxml; kept here only as the reference for parity and speed
+def legacy_match_links(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    if soup.find('div', string='No results with the chosen filters') is not None:
+        return []
+    match_ids = []
+    for link in soup.find_all('a', href=True):
+        href = link['href']
+        if '/matches/' in href and re.search(r'/matches/(\d+)/', href):
+            match_id = re.search(r'/matches/(\d+)/', href).group(1)
+            if match_id not in match_ids:
+                match_ids.append(match_id)
+    return match_ids
+
+
+def legacy_stats_link(html):
+    stat_link = BeautifulSoup(html, 'html.parser').find('a', href=True, string='Detailed stats')
+    return None if stat_link is None else stat_link['href']
+
+
+def legacy_stats_tables(html):
+    dfs = []
+    for idx, table in enumerate(BeautifulSoup(html, 'html.parser').find_all('table')):
+        if idx not in [0, 3]:
+            continue
+        headers = [th.get_text(strip=True) for th in table.find_all('th')]
+        data = [[cell.get_text(strip=True) for cell in row.find_all('td')] for row in table.find_all('tr')]
+        df = pd.DataFrame([row for row in data if row], columns=headers)
+        team_name = df.columns[0]
+        df.rename(columns={team_name: 'players'}, inplace=True)
+        df['team'] = team_name
+        dfs.append(df)
+    return pd.concat(dfs)
+
+
+def write_corpus(pages_dir: str, n_pages: int, filler_kb: int):
+    # the real pages carry a lot of navigation, ads and scripts around the data; filler_kb emulates that
+    filler = '<div class="navbar"><ul>' + '<li><a href="/news/1/x">news item</a><span>text</span></li>' * (filler_kb * 16) + '</ul></div>'
+    os.makedirs(pages_dir, exist_ok=True)
+    ids = [2369000 + 7 * idx for idx in range(n_pages)]
+    pages = [('results_0.html', results_page(ids))]
+    pages += [(f'match_{match_id}.html', match_page(match_id)) for match_id in ids]
+    pages += [(f'stats_{match_id}.html', stats_page(match_id)) for match_id in ids]
+    for name, html in pages:
+        with open(os.path.join(pages_dir, name), 'w', encoding='utf-8') as f:
+            f.write(html.replace('<body>', '<body>' + filler, 1))
+
+
+def load_pages(pages_dir: str, prefix: str) -> list:
+    names = sorted(name for name in os.listdir(pages_dir) if name.startswith(prefix))
+    return [open(os.path.join(pages_dir, name), encoding='utf-8').read() for name in names]
+
+
+def measure(func, pages_dir: str, prefix: str):
+    pages = load_pages(pages_dir, prefix)
+    start = time.perf_counter()
+    results = [func(html) for html in pages]
+    elapsed = time.perf_counter() - start
+
+    # separate pass for the memory, in a fresh process: memory freed by an earlier pass stays in the process and would be
+    # reused without showing up in the RSS
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        peak = executor.submit(rss_growth, func, pages_dir, prefix).result()
+    return results, 1000 * elapsed / len(pages), peak
+
+
+def rss_growth(func, pages_dir: str, prefix: str):
+    # growth of the peak RSS over the RSS before parsing. The RSS counts the C memory of the lxml trees, which tracemalloc
+    # doesn't see; the peak is reset first (linux only), as it never goes down by itself
+    pages = load_pages(pages_dir, prefix)
+    if not reset_peak_rss():
+        return None
+    before = rss_mb('VmRSS')
+    for html in pages:
+        func(html)
+    return rss_mb('VmHWM') - before
+
+
+def reset_peak_rss() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def rss_mb(field: str) -> float:
+    # VmRSS (current) or VmHWM (peak) of this process, from /proc/self/status
+    with open('/proc/self/status', 'r') as f:
+        return int(re.search(rf'{field}:\s+(\d+)', f.read()).group(1)) / 1024
+
+
+def main(pages_dir: str, n_pages: int, filler_kb: int):
+    if pages_dir is None:
+        pages_dir = os.path.join(tempfile.gettempdir(), 'cs_page_corpus')
+        write_corpus(pages_dir, n_pages, filler_kb)
+
+    print(f"{'page':>8} {'parser':>7} {'ms/page':>9} {'peak RSS +MB':>13}")
+    for kind, prefix, legacy, new in [
+        ('results', 'results_', legacy_match_links, page_parser.parse_match_links),
+        ('match', 'match_', legacy_stats_link, page_parser.parse_stats_link),
+        ('stats', 'stats_', legacy_stats_tables, page_parser.parse_stats_tables),
+    ]:
+        old_results, old_ms, old_mb = measure(legacy, pages_dir, prefix)
+        new_results, new_ms, new_mb = measure(new, pages_dir, prefix)
+
+        for old, new_result in zip(old_results, new_results):
+            if isinstance(old, pd.DataFrame):
+                pd.testing.assert_frame_equal(old.reset_index(drop=True), new_result.reset_index(drop=True))
+            else:
+                assert old == new_result
+
+        for name, ms, mb in (('bs4', old_ms, old_mb), ('lxml', new_ms, new_mb)):
+            print(f'{kind:>8} {name:>7} {ms:>9.2f} {"n/a" if mb is None else f"{mb:.1f}":>13}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages-dir', type=str, default=None, help='saved pages (results_*.html, match_*.html, stats_*.html)')
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--filler-kb', type=int, default=100)
+    args = parser.parse_args()
+    main(args.pages_dir, args.pages, args.filler_kb)
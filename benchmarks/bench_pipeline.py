@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import _thread
+import argparse
+import tempfile
+import threading
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'hltv')]
+
+from ledger import ScrapeLedger
+from logger import Logger, WARNING
+from mock_server import MockHLTVServer
+from scrapper_engine import HLTVScraper
+from scrape_pool import ScrapePool
+from rate_limiter import AdaptiveRateLimiter
+
+
+# the crawl before the pipeline, kept as the reference: list one results page, scrape all its matches, then the next page
+def legacy_scrape(scraper: HLTVScraper):
+    pool = ScrapePool(scraper.logger, scraper._new_fetcher, scraper.filepath, scraper.base_url, n_workers=scraper.n_workers, ledger=scraper.ledger)
+    offset, consecutive_failures = 0, 0
+    while consecutive_failures < 2:
+        match_ids = scraper._get_match_links(offset)
+        offset += 100
+        if not match_ids:
+            consecutive_failures += 1
+            continue
+
+        consecutive_failures = 0
+        scraper.ledger.add(match_ids, offset - 100)
+        pool.run(scraper.ledger.to_scrape(match_ids, scraper.max_total_attempts))
+    scraper.listing_fetcher.close()
+
+
+def new_scraper(server: MockHLTVServer, n_workers: int, max_rate: float, prefetch_pages: int = 2, filepath: str = None) -> HLTVScraper:
+    filepath = filepath or tempfile.mkdtemp(prefix='cs_pipeline_')
+    limiter = AdaptiveRateLimiter(rate=max_rate, max_rate=max_rate)
+    return HLTVScraper(Logger(background=False, level=WARNING), filepath, base_url=server.base_url, n_workers=n_workers,
+                       fetcher='http', limiter=limiter, prefetch_pages=prefetch_pages)
+
+
+def saved(scraper: HLTVScraper) -> int:
+    return len([name for name in os.listdir(scraper.filepath) if name.endswith('.csv')])
+
+
+def main(n_matches: int, latency: tuple, n_workers: int, max_rate: float, prefetch_pages: int, interrupt_after: float):
+    with MockHLTVServer(n_matches=n_matches, latency=latency) as server:
+        scraper = new_scraper(server, n_workers, max_rate)
+        start = time.perf_counter()
+        legacy_scrape(scraper)
+        t_legacy = time.perf_counter() - start
+        print(f'{n_matches} matches, {n_workers} workers, latency {latency[0]}-{latency[1]} s, at most {max_rate:.0f} requests/s')
+        print(f'  page by page: {saved(scraper)} matches in {t_legacy:.1f} s ({60 * saved(scraper) / t_legacy:.0f} matches/minute)')
+
+        scraper = new_scraper(server, n_workers, max_rate, prefetch_pages)
+        start = time.perf_counter()
+        scraper.scrape_all_matches()
+        t_pipeline = time.perf_counter() - start
+        print(f'  pipelined:    {saved(scraper)} matches in {t_pipeline:.1f} s ({60 * saved(scraper) / t_pipeline:.0f} matches/minute)')
+
+        # a KeyboardInterrupt in the middle of the crawl: every fetched page is written, the rest is picked up by the next run
+        scraper = new_scraper(server, n_workers, max_rate, prefetch_pages)
+        timer = threading.Timer(interrupt_after, _thread.interrupt_main)
+        timer.start()
+        start = time.perf_counter()
+        scraper.scrape_all_matches()
+        t_drain = time.perf_counter() - start - interrupt_after
+        done = scraper.ledger.count(ScrapeLedger.DONE)
+        print(f'  interrupted after {interrupt_after:.0f} s: drained in {t_drain:.2f} s, {saved(scraper)} files / {done} done in the ledger')
+
+        # the next run, on the same folder and ledger, finishes the crawl
+        scraper = new_scraper(server, n_workers, max_rate, prefetch_pages, filepath=scraper.filepath)
+        scraper.scrape_all_matches()
+        print(f'  resumed run: {saved(scraper)} of {n_matches} matches saved')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=500)
+    parser.add_argument('--latency', type=float, nargs=2, default=(0.05, 0.3))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--max-rate', type=float, default=50.0, help='requests per second allowed by the limiter')
+    parser.add_argument('--prefetch-pages', type=int, default=2)
+    parser.add_argument('--interrupt-after', type=float, default=5.0, help='seconds before the KeyboardInterrupt of the drain check')
+    args = parser.parse_args()
+    main(args.matches, tuple(args.latency), args.workers, args.max_rate, args.prefetch_pages, args.interrupt_after)
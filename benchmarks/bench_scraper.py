@@ -0,0 +1,50 @@
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'hltv')]
+
+from logger import Logger
+from mock_server import MockHLTVServer
+from scrapper_engine import HLTVScraper
+from rate_limiter import AdaptiveRateLimiter
+
+# fixed sleeps of the scraper before the condition-based waits: 15s + 2s per results page (100 matches), 5s + 2s per match (2 pages)
+FIXED_SLEEP_PER_RESULTS_PAGE = 17
+FIXED_SLEEP_PER_MATCH = 7
+
+
+def main(n_matches: int, latency: tuple, challenge_rate: float, n_workers: int, fetcher: str, max_rate: float):
+    with MockHLTVServer(n_matches=n_matches, latency=latency, challenge_rate=challenge_rate) as server:
+        filepath = tempfile.mkdtemp(prefix='cs_scrape_')
+        limiter = AdaptiveRateLimiter(rate=max_rate, max_rate=max_rate)  # the politeness limit caps the throughput of any number of workers
+        scraper = HLTVScraper(Logger(), filepath, base_url=server.base_url, n_workers=n_workers, fetcher=fetcher, limiter=limiter)
+
+        start = time.perf_counter()
+        scraper.scrape_all_matches()
+        elapsed = time.perf_counter() - start
+
+    pages = server.requests
+    results_pages = n_matches // 100 + 1
+    old_floor = results_pages * FIXED_SLEEP_PER_RESULTS_PAGE + n_matches * FIXED_SLEEP_PER_MATCH
+    old_pages = results_pages + 2 * n_matches
+
+    saved = len([name for name in os.listdir(filepath) if re.fullmatch(r'match_\d+\.csv', name)])  # not the ledger and page cache
+    print(f'{n_workers} {fetcher} workers: {saved} matches saved, {pages} requests in {elapsed:.1f}s')
+    print(f'before (fixed sleeps, upper bound): {60 * old_pages / old_floor:.1f} pages/minute')
+    print(f'after: {60 * pages / elapsed:.1f} pages/minute')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=200)
+    parser.add_argument('--latency', type=float, nargs=2, default=(0.1, 0.5))
+    parser.add_argument('--challenge-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--fetcher', choices=['browser', 'http', 'auto'], default='browser')
+    parser.add_argument('--max-rate', type=float, default=2.0, help='requests per second allowed by the limiter')
+    args = parser.parse_args()
+    main(args.matches, tuple(args.latency), args.challenge_rate, args.workers, args.fetcher, args.max_rate)
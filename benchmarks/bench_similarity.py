@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from similarity import SimilarityIndex
+from synthetic import player_features
+
+
+# one full scan per query, as an ad-hoc comparison would do it; kept here only as the reference for parity and speed
+def brute_force(index: SimilarityIndex, player: str, k: int) -> np.ndarray:
+    distances = np.sqrt(((index.x - index.x[index.rows[player]]) ** 2).sum(axis=1))
+    distances[index.rows[player]] = np.inf
+    return index.players[np.argsort(distances, kind='stable')[:k]]
+
+
+def timed(func, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main(sizes, k: int, n_queries: int):
+    print(f"{'players':>8} | {'build ms':>8} | {'brute us':>9} {'tree us':>8} {'tree raw us':>11} | {'batch us/player':>15}")
+    for n_players in sizes:
+        features = player_features(n_players)
+        index, t_build = timed(lambda: SimilarityIndex(features))
+        queries = list(index.players[np.random.default_rng(0).choice(n_players, min(n_queries, n_players), replace=False)])
+
+        # parity with the full scan (same players, same order)
+        for player in queries[:20]:
+            assert list(index.similar(player, k)['player']) == list(brute_force(index, player, k))
+
+        _, t_brute = timed(lambda: [brute_force(index, player, k) for player in queries])
+        _, t_tree = timed(lambda: [index.similar(player, k) for player in queries])
+        # the tree query alone, without building the result dataframe
+        _, t_raw = timed(lambda: [index.tree.query(index.x[index.rows[player]][None, :], k=k + 1) for player in queries])
+        _, t_batch = timed(lambda: index.similar_batch(queries, k))
+
+        per_query = 1e6 / len(queries)
+        print(f'{n_players:>8,} | {t_build * 1000:>8.1f} | {t_brute * per_query:>9.0f} {t_tree * per_query:>8.0f} {t_raw * per_query:>11.0f} | '
+              f'{t_batch * per_query:>15.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+    main(args.sizes, args.k, args.queries)
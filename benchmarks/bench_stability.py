@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from clustering import scale_features
+from logger import Logger, WARNING
+from stability import cluster_stability
+from synthetic import player_features
+
+
+# pair by pair, run by run; kept here only as the reference for the parity (and speed) of StabilityResult.co_assignment
+def legacy_co_assignment(runs: np.ndarray) -> np.ndarray:
+    n_runs, n_players = runs.shape
+    matrix = np.zeros((n_players, n_players))
+    for run in runs:
+        for i in range(n_players):
+            for j in range(n_players):
+                matrix[i, j] += run[i] == run[j]
+    return matrix / n_runs
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(n_players: int, n_runs: int, n_clusters: int, jobs):
+    logger = Logger(background=False, level=WARNING)
+    x = scale_features(player_features(n_players))
+    print(f'{n_players} players, {n_runs} runs, {n_clusters} clusters, {os.cpu_count()} cores')
+
+    t_single = None
+    for n_jobs in jobs:
+        result, seconds = timed(lambda: cluster_stability(x, logger, n_clusters=n_clusters, n_runs=n_runs, n_jobs=n_jobs))
+        t_single = t_single or seconds
+        print(f'  {n_jobs:>2} processes: {seconds:7.2f} s  ({t_single / seconds:.2f}x)')
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cluster_stability(x, logger, n_clusters=n_clusters, n_runs=n_runs, n_jobs=1, cache_dir=cache_dir)
+        _, t_cached = timed(lambda: cluster_stability(x, logger, n_clusters=n_clusters, n_runs=n_runs, cache_dir=cache_dir))
+    print(f'  cached:       {t_cached:7.2f} s')
+
+    co_assignment, t_vectorized = timed(result.co_assignment)
+    sample = result.runs[:, :200]  # the loops are too slow for the whole matrix
+    legacy, t_legacy = timed(lambda: legacy_co_assignment(sample))
+    np.testing.assert_allclose(co_assignment[:200, :200], legacy, rtol=1e-6)
+    print(f'  co-assignment ({n_players}x{n_players}): {t_vectorized * 1000:.1f} ms; loops on 200x200: {t_legacy * 1000:.0f} ms')
+
+    confidence = result.confidence
+    print(f'  confidence: mean {confidence.mean():.3f}, players below 0.9: {(confidence < 0.9).sum()}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--clusters', type=int, default=4)
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, os.cpu_count()])
+    args = parser.parse_args()
+    main(args.players, args.runs, args.clusters, args.jobs)
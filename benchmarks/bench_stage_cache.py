@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import pandas as pd
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from cleaning import DataCleaning
+from clustering import final_data
+from logger import Logger, WARNING
+from pipeline import PipelineRunner
+from synthetic import write_match_files
+
+
+def run(logger: Logger, filepath: str, cache_path: str, store_path: str, **params):
+    runner = PipelineRunner(logger, filepath, cache_path, store_path=store_path, **params)
+    start = time.perf_counter()
+    df = runner.run()
+    return df, time.perf_counter() - start, runner.report_df()
+
+
+def main(n_matches: int, n_players: int, n_added: int):
+    logger = Logger(background=False, level=WARNING)
+    with tempfile.TemporaryDirectory() as folder:
+        filepath, cache_path, store_path = [os.path.join(folder, name) for name in ('files', 'stages', 'store')]
+        write_match_files(filepath, n_matches, n_players=n_players)
+
+        # the pipeline without any cache, as it ran before the runner
+        start = time.perf_counter()
+        reference = final_data(DataCleaning(logger, filepath, verbose=False).third_stage_df(), logger, n_clusters=4, n_components=2)
+        t_reference = time.perf_counter() - start
+        print(f'{n_matches:,} matches, {n_players} players; pipeline without cache: {t_reference:.2f} s')
+        print(f"{'run':<28} | {'wall s':>6} | {'saved s':>7} | stages (run / hit)")
+
+        def report(name: str, result):
+            df, seconds, stages = result
+            ran = ', '.join(stages.loc[stages['status'] == 'run', 'stage']) or '-'
+            hit = ', '.join(stages.loc[stages['status'] == 'hit', 'stage']) or '-'
+            print(f'{name:<28} | {seconds:>6.2f} | {stages["saved"].sum():>7.2f} | {ran} / {hit}')
+            return df
+
+        pd.testing.assert_frame_equal(report('cold', run(logger, filepath, cache_path, store_path)), reference)
+        pd.testing.assert_frame_equal(report('same inputs', run(logger, filepath, cache_path, store_path)), reference)
+        report('threshold_matches 30', run(logger, filepath, cache_path, store_path, threshold_matches=30))
+        report('n_clusters 5', run(logger, filepath, cache_path, store_path, n_clusters=5))
+        report('back to the defaults', run(logger, filepath, cache_path, store_path))
+
+        files = sorted(os.listdir(filepath))[:n_added]
+        for idx, file in enumerate(files):
+            shutil.copy(os.path.join(filepath, file), os.path.join(filepath, f'match_9{idx:06d}.csv'))
+        report(f'{n_added} files added', run(logger, filepath, cache_path, store_path))
+
+        # the store re-reads the files whose mtime changed, so the touch goes after the files are added
+        for file in sorted(os.listdir(filepath)):
+            os.utime(os.path.join(filepath, file))  # same contents, new mtime
+        report('files touched', run(logger, filepath, cache_path, store_path))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=5000)
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--added', type=int, default=100)
+    args = parser.parse_args()
+    main(args.matches, args.players, args.added)
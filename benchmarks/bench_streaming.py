@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from cleaning import DataCleaning
+from clustering import final_data, scale_features, streaming_final_data
+from logger import Logger, WARNING
+from synthetic import synthetic_rows
+
+
+# raw player-match rows split in parquet files of chunk_rows rows, standing in for the batches of the store
+def write_chunks(path: str, n_rows: int, chunk_rows: int) -> list:
+    files = []
+    for i, start in enumerate(range(0, n_rows, chunk_rows)):
+        file = os.path.join(path, f'chunk_{i:05d}.parquet')
+        synthetic_rows(min(chunk_rows, n_rows - start), seed=i).to_parquet(file, index=False)
+        files.append(file)
+    return files
+
+
+def wcss(x: np.ndarray, labels: np.ndarray) -> float:
+    return sum(((x[labels == label] - x[labels == label].mean(axis=0)) ** 2).sum() for label in np.unique(labels))
+
+
+def measured(func):
+    # separate run for the memory, tracemalloc slows everything down
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result, seconds, peak_mb
+
+
+def main(sizes, chunk_rows: int, n_clusters: int, n_components: int):
+    logger = Logger(background=False, level=WARNING)
+    dc = DataCleaning(logger, filepath='', verbose=False)
+
+    print(f"{'rows':>10} | {'in-memory s':>11} {'peak MB':>8} | {'streaming s':>11} {'peak MB':>8} | {'WCSS ratio':>10}")
+    for n_rows in sizes:
+        with tempfile.TemporaryDirectory() as path:
+            files = write_chunks(path, n_rows, chunk_rows)
+
+            def chunks():
+                for file in files:
+                    yield dc._parse_stats(pd.read_parquet(file))
+
+            def whole_table():
+                df = pd.concat(list(chunks()), ignore_index=True)
+                # final_data scales the float64/int64 columns, as the per-player means are
+                return df.astype({col: 'float64' for col in df.columns if col != 'players'})
+
+            in_memory = lambda: final_data(whole_table(), logger, n_clusters=n_clusters, n_components=n_components)
+
+            output_path = os.path.join(path, 'clusters.parquet')
+            streaming = lambda: streaming_final_data(chunks, logger, n_clusters=n_clusters, n_components=n_components,
+                                                     output_path=output_path)
+
+            old, t_old, peak_old = measured(in_memory)
+            _, t_new, peak_new = measured(streaming)
+            new = pd.read_parquet(output_path)
+            assert list(new.columns) == list(old.columns) and len(new) == len(old)
+            # within-cluster sum of squares of the streaming clusters relative to the in-memory ones, on the same scaled
+            # features (1 = as compact; the synthetic rows have no role structure, so the partitions themselves differ)
+            x = scale_features(whole_table())
+            ratio = wcss(x, new['cluster'].to_numpy()) / wcss(x, old['cluster'].to_numpy())
+
+            print(f'{n_rows:>10,} | {t_old:>11.2f} {peak_old:>8.1f} | {t_new:>11.2f} {peak_new:>8.1f} | {ratio:>10.3f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 500_000, 2_000_000])
+    parser.add_argument('--chunk-rows', type=int, default=100_000)
+    parser.add_argument('--clusters', type=int, default=4)
+    parser.add_argument('--components', type=int, default=2)
+    args = parser.parse_args()
+    main(args.sizes, args.chunk_rows, args.clusters, args.components)
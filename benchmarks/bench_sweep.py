@@ -0,0 +1,30 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from clustering import sweep_k
+
+
+def main(n_rows: int, n_jobs: int):
+    rng = np.random.default_rng(42)
+    centers = rng.normal(0, 3, (5, 7))
+    x = centers[rng.integers(0, 5, n_rows)] + rng.normal(0, 1, (n_rows, 7))
+
+    for label, kwargs in [('serial', {'n_jobs': 1}), (f'parallel ({n_jobs} jobs)', {'n_jobs': n_jobs}),
+                          ('parallel, mini-batch', {'n_jobs': n_jobs, 'mini_batch': True})]:
+        start = time.perf_counter()
+        sweep = sweep_k(x, **kwargs)
+        print(f'{label:>24}: {time.perf_counter() - start:.2f}s')
+    print(sweep.round(3).to_string(index=False))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    main(args.rows, args.jobs)
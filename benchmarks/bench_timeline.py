@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from clustering import final_data, windowed_final_data
+from logger import Logger, WARNING
+from synthetic import ROLES
+from timeline import PlayerTimeline
+
+FEATURES = ['KAST', 'ADR', 'Swing', 'hs', 'opk', 'opd', '1vsX']
+
+
+def timeline_rows(n_rows: int, n_players: int = 500, days: int = 730, drift_rate: float = 0.1, seed: int = 42) -> pd.DataFrame:
+    # per-match rows spread over days, one blob per role; drift_rate of the players switch role halfway
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 1, (len(ROLES), len(FEATURES)))
+    roles = rng.integers(0, len(ROLES), n_players)
+    new_roles = np.where(rng.random(n_players) < drift_rate, rng.integers(0, len(ROLES), n_players), roles)
+
+    players = rng.integers(0, n_players, n_rows)
+    offsets = np.sort(rng.integers(0, days * 86400, n_rows))
+    role = np.where(offsets < days * 86400 // 2, roles[players], new_roles[players])
+
+    df = pd.DataFrame(centers[role] + rng.normal(0, 1.5, (n_rows, len(FEATURES))), columns=FEATURES)
+    df.insert(0, 'players', pd.Categorical([f'player_{i}' for i in players]))
+    df['date'] = pd.Timestamp('2024-01-01') + pd.to_timedelta(offsets, unit='s')
+    return df
+
+
+# a filtered copy and a groupby per window, as the windows had to be computed before the timeline; kept as the reference
+def legacy_rolling(df: pd.DataFrame, ends: list, days: int, min_matches: int) -> list:
+    windows = []
+    for end in ends:
+        window = df[(df['date'] >= end - pd.Timedelta(days=days)) & (df['date'] < end)]
+        grouped = window.groupby('players', observed=True)
+        means = grouped[FEATURES].mean()[grouped.size() >= min_matches]
+        means.index = means.index.astype(str)
+        windows.append(means.sort_index().rename_axis('players').reset_index())
+    return windows
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def continuity(result: pd.DataFrame) -> float:
+    # share of the players that keep their cluster number from one window to the next
+    ends = sorted(result['window_end'].unique())
+    kept = []
+    for previous, current in zip(ends, ends[1:]):
+        merged = result[result['window_end'] == previous].merge(result[result['window_end'] == current], on='player')
+        kept.append((merged['cluster_x'] == merged['cluster_y']).mean())
+    return float(np.mean(kept))
+
+
+def main(n_rows: int, days: int, step_days: int, min_matches: int, n_clusters: int):
+    logger = Logger(background=False, level=WARNING)
+    df = timeline_rows(n_rows)
+    timeline, t_build = timed(lambda: PlayerTimeline(df, FEATURES))
+    print(f'{n_rows:,} rows, {days}-day windows every {step_days} days; index built in {t_build * 1000:.0f} ms')
+
+    start, end = pd.Timestamp('2024-06-01'), pd.Timestamp('2024-07-01')
+    _, t_range = timed(lambda: [timeline.range(start, end) for _ in range(100)])
+    _, t_mask = timed(lambda: [df[(df['date'] >= start) & (df['date'] < end)] for _ in range(100)])
+    _, t_player = timed(lambda: [timeline.player_range('player_7', start, end) for _ in range(100)])
+    _, t_player_mask = timed(lambda: [df[(df['players'] == 'player_7') & (df['date'] >= start) & (df['date'] < end)] for _ in range(100)])
+    print(f'  range query (1 month):   {t_range * 10:.2f} ms  (boolean mask: {t_mask * 10:.2f} ms)')
+    print(f'  player range query:      {t_player * 10:.2f} ms  (boolean mask: {t_player_mask * 10:.2f} ms)')
+
+    windows, t_rolling = timed(lambda: list(timeline.rolling(days, step_days, min_matches=min_matches)))
+    legacy, t_legacy = timed(lambda: legacy_rolling(df, [window_end for window_end, _ in windows], days, min_matches))
+    for (_, means), reference in zip(windows, legacy):
+        pd.testing.assert_frame_equal(means, reference, check_exact=False, rtol=1e-9)
+    print(f'  {len(windows)} rolling windows:      {t_rolling:.2f} s  (filtered copy + groupby per window: {t_legacy:.2f} s)')
+
+    # from scratch first, so the warm-started run doesn't get the one-off setup of sklearn for free; it also rebuilds the windows
+    cold, t_cold = timed(lambda: pd.concat([final_data(means, logger, n_clusters, 2).assign(window_end=window_end)
+                                            for window_end, means in windows], ignore_index=True))
+    warm, t_warm = timed(lambda: windowed_final_data(timeline, logger, n_clusters, 2, days, step_days, min_matches=min_matches))
+    print(f'  windowed clustering:     {t_warm:.2f} s warm-started (windows included), {t_cold:.2f} s from scratch (windows given)')
+    print(f'  players keeping their cluster number between windows: {continuity(warm):.1%} warm-started, {continuity(cold):.1%} from scratch')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--step-days', type=int, default=7)
+    parser.add_argument('--min-matches', type=int, default=10)
+    parser.add_argument('--clusters', type=int, default=4)
+    args = parser.parse_args()
+    main(args.rows, args.days, args.step_days, args.min_matches, args.clusters)
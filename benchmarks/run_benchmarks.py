@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path[:0] = [os.path.join(os.path.dirname(__file__), '..'), os.path.join(os.path.dirname(__file__), '..', 'analysis')]
+
+from cleaning import DataCleaning
+from clustering import scale_features, assign_clusters, apply_pca
+from figures import scatter_figure
+from logger import Logger
+from synthetic import write_match_files
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+
+# end-to-end suite: times each stage of the pipeline on a synthetic dataset, records the peak memory of each stage and
+# compares the results with the stored baseline of the same scale
+def run_suite(n_matches: int, n_players: int, memory: bool = True) -> dict:
+    filepath = os.path.join(tempfile.gettempdir(), f'cs_suite_{n_matches}_{n_players}')
+    if not os.path.isdir(filepath) or len(os.listdir(filepath)) != n_matches:
+        print(f'Writing {n_matches} synthetic match files into {filepath}...')
+        write_match_files(filepath, n_matches, n_players=n_players, n_workers=os.cpu_count())
+
+    dc = DataCleaning(Logger(), filepath, verbose=False)
+    state = {}
+
+    stages = [
+        ('ingest', lambda: dc._first_stage_df(), 'raw'),
+        ('second_stage', lambda: dc._parse_stats(state['raw']), 'second'),
+        ('third_stage', lambda: dc._player_means(state['second']), 'means'),
+        ('scaling', lambda: scale_features(state['means']), 'x'),
+        ('kmeans', lambda: assign_clusters(state['x'], k=4), 'labels'),
+        ('pca', lambda: apply_pca(state['x'], state['means'][['players']].assign(cluster=state['labels']), n_components=2), 'pca'),
+        ('figure', lambda: _figure(state['pca']), 'fig'),
+    ]
+
+    results = {}
+    for name, func, output in stages:
+        start = time.perf_counter()
+        state[output] = func()
+        results[name] = {'seconds': time.perf_counter() - start}
+
+        if memory:
+            # separate run for the memory, tracemalloc slows everything down
+            tracemalloc.start()
+            func()
+            results[name]['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+
+        print(f"{name:>14}: {results[name]['seconds']:8.3f}s" + (f"  {results[name]['peak_mb']:9.1f} MB" if memory else ''))
+
+    return results
+
+
+def _figure(df_pca):
+    # the scatter of the dashboard (figures.scatter_figure: WebGL traces, decimated with the density contour above the point
+    # budget), serialized as it is sent to the browser; the dashboard module itself starts the app when imported
+    fig = scatter_figure(df_pca.assign(role=df_pca['cluster'].astype(str)), title='clusters')
+    return fig.to_json()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric, floor in (('seconds', 0.05), ('peak_mb', 1.0)):
+            if metric not in result or metric not in baseline[name]:
+                continue
+            old, new = baseline[name][metric], result[metric]
+            if new > old * (1 + tolerance) and new - old > floor:  # ignores noise on very small values
+                regressions.append(f'{name} {metric}: {old:.3f} -> {new:.3f}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=1000, help='1k to 1M matches')
+    parser.add_argument('--players', type=int, default=100, help='size of the player pool')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurements')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline for this scale')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown/memory growth before failing')
+    parser.add_argument('--baseline-file', type=str, default=BASELINE_FILE)
+    args = parser.parse_args()
+
+    results = run_suite(args.matches, args.players, memory=not args.no_memory)
+
+    key = f'{args.matches}x{args.players}'
+    baselines = {}
+    if os.path.exists(args.baseline_file):
+        with open(args.baseline_file, 'r') as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines[key] = results
+        with open(args.baseline_file, 'w') as f:
+            json.dump(baselines, f, indent=2)
+        print(f'Baseline saved for {key}')
+    elif key in baselines:
+        regressions = compare(results, baselines[key], args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        sys.exit(1 if regressions else 0)
+    else:
+        print(f'No baseline for {key} (run with --save-baseline)')
@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+
+# header of the scraped files; hltv repeats KAST/eKAST (pandas reads them as KAST.1/eKAST.1) and older files have OpK-D instead of Op.K-D
+# and no date and event
+HEADER = ['players', 'Op.K-D', 'Op.eK-eD', 'MKs', 'KAST', 'eKAST', '1vsX', 'K(hs)', 'eK(hs)', 'A(f)', 'D(t)', 'eD(t)', 'ADR', 'eADR',
+          'KAST', 'eKAST', 'Swing', 'Rating3.0', 'team', 'date', 'event']
+
+# per role: kills per round, headshot rate, opening kill rate, opening death rate, clutches per match, KAST shift
+ROLES = np.array([
+    [0.62, 0.50, 0.12, 0.13, 0.35, 0.0],   # support
+    [0.78, 0.22, 0.20, 0.10, 0.45, 2.0],   # awper
+    [0.74, 0.55, 0.22, 0.24, 0.25, -3.0],  # entry fragger
+    [0.70, 0.48, 0.09, 0.08, 0.60, 1.0],   # lurker
+])
+
+
+# generates player-match rows in the same layout as the scraped HLTV csv files
+def synthetic_rows(n_rows: int, n_players: int = 500, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    kills = rng.integers(0, 40, n_rows)
+    hs = rng.binomial(kills, 0.45)
+    assists = rng.integers(0, 15, n_rows)
+    flash = rng.binomial(assists, 0.2)
+    deaths = rng.integers(0, 35, n_rows)
+    traded = rng.binomial(deaths, 0.25)
+    opk = rng.binomial(kills, 0.15)
+    opd = rng.binomial(deaths, 0.15)
+    kast = rng.uniform(40, 90, n_rows).round(1)
+    swing = rng.normal(0, 3, n_rows).round(2)
+
+    def kad(total, inner):
+        return pd.Series(total.astype(str)).str.cat(pd.Series(inner.astype(str)), sep='(') + ')'
+
+    def perc(values, signed=False):
+        text = pd.Series(np.abs(values).astype(str)) + '%'
+        if signed:
+            text = np.where(values >= 0, '+', '-') + text
+        return text
+
+    return pd.DataFrame({
+        'players': 'player_' + pd.Series(rng.integers(0, n_players, n_rows).astype(str)),
+        'Op.K-D': pd.Series(opk.astype(str)) + ' : ' + pd.Series(opd.astype(str)),
+        'MKs': rng.integers(0, 8, n_rows),
+        'KAST': perc(kast),
+        '1vsX': rng.integers(0, 3, n_rows),
+        'K(hs)': kad(kills, hs),
+        'A(f)': kad(assists, flash),
+        'D(t)': kad(deaths, traded),
+        'ADR': rng.uniform(40, 120, n_rows).round(1),
+        'Swing': perc(swing, signed=True),
+        'Rating3.0': rng.uniform(0.5, 1.6, n_rows).round(2),
+        'team': 'team_' + pd.Series(rng.integers(0, 100, n_rows).astype(str)),
+        'match': np.arange(n_rows) // 10,
+    })
+
+
+# per-player means in the layout of third_stage_df, one blob per role; for the benchmarks that start after the aggregation
+def player_features(n_players: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    columns = ['KAST', 'ADR', 'Swing', 'hs', 'opk', 'opd', '1vsX']
+    centers = rng.normal(0, 1, (len(ROLES), len(columns)))
+    values = centers[rng.integers(0, len(ROLES), n_players)] + rng.normal(0, 0.5, (n_players, len(columns)))
+    df = pd.DataFrame(values, columns=columns)
+    df.insert(0, 'players', [f'player_{i}' for i in range(n_players)])
+    return df
+
+
+def write_match_files(filepath: str, n_matches: int, n_players: int = 500, seed: int = 42, legacy_header_rate: float = 0.1,
+                      n_workers: int = 1, chunk_size: int = 1000):
+    """
+    Writes one match_<id>.csv per match, in the exact layout of the scraper: 2 teams of 5 players, each player with a
+    (hidden) role that shapes the player's stats, so the clustering has something to find.
+    n_players: size of the player pool; players are split into teams of 5
+    legacy_header_rate: fraction of files written with the old OpK-D header
+    n_workers: processes writing the files (useful from ~100k matches)
+    """
+    os.makedirs(filepath, exist_ok=True)
+    chunks = [(filepath, start, min(start + chunk_size, n_matches), n_players, seed, legacy_header_rate)
+              for start in range(0, n_matches, chunk_size)]
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            list(executor.map(_write_chunk, *zip(*chunks)))
+    else:
+        for chunk in chunks:
+            _write_chunk(*chunk)
+
+
+def _write_chunk(filepath: str, start: int, end: int, n_players: int, seed: int, legacy_header_rate: float):
+    # the player pool (names, roles, teams) only depends on the seed, so every chunk sees the same players
+    pool_rng = np.random.default_rng(seed)
+    n_teams = max(2, n_players // 5)
+    roles = pool_rng.integers(0, len(ROLES), n_teams * 5)
+    skill = pool_rng.normal(1.0, 0.08, n_teams * 5)
+
+    rng = np.random.default_rng([seed, start])
+    header = ','.join(HEADER)
+    legacy_header = ','.join(HEADER[:-2]).replace('Op.K-D', 'OpK-D', 1)
+
+    for match_number in range(start, end):
+        teams = rng.choice(n_teams, 2, replace=False)
+        legacy = rng.random() < legacy_header_rate
+        lines = [legacy_header if legacy else header]
+        rounds = int(rng.integers(30, 75))  # the whole match (all maps)
+        # one match every 3 hours from 2024-01-01, 50 matches per event
+        match_info = '' if legacy else f",{pd.Timestamp('2024-01-01') + pd.Timedelta(hours=3 * match_number)},Event {match_number // 50}"
+
+        for team in teams:
+            for player in range(team * 5, team * 5 + 5):
+                lines.append(_player_line(rng, f'player_{player}', f'Team {team}', ROLES[roles[player]], skill[player], rounds) + match_info)
+
+        with open(os.path.join(filepath, f'match_{2_000_000 + match_number}.csv'), 'w', newline='') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def _player_line(rng, name: str, team: str, role: np.ndarray, skill: float, rounds: int):
+    kpr, hs_rate, opk_rate, opd_rate, clutches, kast_shift = role
+
+    kills = rng.poisson(rounds * kpr * skill)
+    deaths = rng.poisson(rounds * 0.68 / skill)
+    assists = rng.poisson(rounds * 0.15)
+    hs = rng.binomial(kills, hs_rate)
+    opk = rng.binomial(kills, opk_rate)
+    opd = rng.binomial(deaths, opd_rate)
+    kast = min(100.0, max(0.0, rng.normal(71 + kast_shift, 6)))
+    adr = max(0.0, rng.normal(kills / rounds * 105 + 5, 8))
+    swing = rng.normal((skill - 1) * 20, 2)
+    rating = max(0.0, rng.normal(skill * (kills / max(deaths, 1)) ** 0.35, 0.1))
+
+    # the e* columns are the economy-adjusted versions; close to the plain ones
+    e_kills = max(0, kills + int(rng.integers(-2, 3)))
+    e_deaths = max(0, deaths + int(rng.integers(-2, 3)))
+    values = [
+        name, f'{opk} : {opd}', f'{opk} : {opd}', rng.binomial(rounds, 0.08), f'{kast:.1f}%', f'{kast:.1f}%',
+        rng.poisson(clutches), f'{kills}({hs})', f'{e_kills}({min(hs, e_kills)})', f'{assists}({rng.binomial(assists, 0.2)})',
+        f'{deaths}({rng.binomial(deaths, 0.22)})', f'{e_deaths}({rng.binomial(e_deaths, 0.22)})', f'{adr:.1f}', f'{adr:.1f}',
+        f'{kast:.1f}%', f'{kast:.1f}%', f'{swing:+.2f}%', f'{rating:.2f}', team
+    ]
+    return ','.join(map(str, values))
@@ -0,0 +1,195 @@
+import undetected_chromedriver as uc
+from selenium.common.exceptions import InvalidSessionIdException, TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+import urllib3
+import socket
+import urllib.error
+from logger import Logger
+from rate_limiter import AdaptiveRateLimiter
+
+
+RESULTS_PAGE = 'results'
+MATCH_PAGE = 'match'
+STATS_PAGE = 'stats'
+
+# conditions that tell a page is ready; the waits return as soon as they are met instead of sleeping for a fixed time
+PAGE_LOADED = {
+    RESULTS_PAGE: EC.any_of(
+        EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='/matches/']")),
+        EC.text_to_be_present_in_element((By.TAG_NAME, 'body'), 'No results with the chosen filters')
+    ),
+    # the date and event block is on every match page, so a match without stats is loaded (and fails to parse) right away
+    MATCH_PAGE: EC.any_of(
+        EC.presence_of_element_located((By.LINK_TEXT, 'Detailed stats')),
+        EC.presence_of_element_located((By.CSS_SELECTOR, '.timeAndEvent'))
+    ),
+    STATS_PAGE: EC.presence_of_element_located((By.TAG_NAME, 'table'))
+}
+
+
+class FetchError(Exception):
+    pass
+
+
+class ChallengeError(FetchError):
+    pass
+
+
+def is_challenge(html: str) -> bool:
+    return 'just a moment' in html[:2000].lower()
+
+
+# one chrome session; it is only started on the first request, and restarting it only affects its own worker
+class BrowserFetcher:
+    def __init__(self, logger: Logger, limiter: AdaptiveRateLimiter, base_url: str, page_timeout: int = 30):
+        self.logger = logger
+        self.limiter = limiter
+        self.base_url = base_url
+        self.page_timeout = page_timeout
+        self.driver = None
+
+    def get(self, url: str, kind: str) -> str:
+        if self.driver is None:
+            self._start()
+
+        with self.logger.span('rate_limit_wait'):
+            self.limiter.acquire()
+
+        with self.logger.span('page_load'):
+            try:
+                self.driver.get(url)
+            except (socket.gaierror, urllib.error.URLError) as e:
+                self._failed()
+                raise FetchError(f"Network error: {e}")
+            except Exception as e:
+                self._failed()
+                if "invalid session id" in str(e).lower():
+                    self.logger.log("Session dead, restarting Chrome...")
+                    self.restart()
+                raise FetchError(f"Error while loading {url}: {e}")
+
+            try:
+                WebDriverWait(self.driver, self.page_timeout).until(PAGE_LOADED[kind])
+            except TimeoutException:
+                if is_challenge(self.driver.page_source):
+                    self._failed(challenge=True)
+                    raise ChallengeError(f"Challenge page at {url}")
+                self._failed()
+                raise FetchError(f"Timed out waiting for {url}")
+
+        self.limiter.on_success()
+        self.logger.count('pages_fetched')
+        return self.driver.page_source
+
+    def _failed(self, challenge: bool = False):
+        if challenge:
+            self.limiter.on_challenge()
+            self.logger.count('challenge_pages')
+        else:
+            self.limiter.on_error()
+            self.logger.count('fetch_errors')
+
+    def restart(self):
+        # the session is started again on the next request; the limiter has already backed off, so there is no fixed stall here
+        if self.driver is not None:
+            self.logger.count('chrome_restarts')
+        self.close()
+
+    def close(self):
+        if self.driver is None:
+            return
+
+        try:
+            self.driver.quit()
+        except InvalidSessionIdException:
+            self.logger.log("Driver already quit (ignored)")
+        except Exception as e:
+            self.logger.warning(f"Error quitting driver: {e}")
+        self.driver = None
+
+    def _start(self):
+        options = uc.ChromeOptions()
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument("--window-position=-32000,-32000")  # hide window from screen; couldn't do headless, using this instead so one can use the computer screen
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--disable-software-rasterizer")
+        options.add_argument('--disable-blink-features=AutomationControlled')
+
+        self.driver = uc.Chrome(options=options)
+
+        self.logger.log("Opening HLTV.org...")
+        self.limiter.acquire()
+        self.driver.get(self.base_url)
+
+
+# lightweight client over a shared connection pool; much cheaper than a browser, but it can't get past challenge pages
+class HttpFetcher:
+    def __init__(self, logger: Logger, limiter: AdaptiveRateLimiter, pool: urllib3.PoolManager = None, timeout: int = 30):
+        self.logger = logger
+        self.limiter = limiter
+        self.pool = pool if pool is not None else http_pool()
+        self.timeout = timeout
+
+    def get(self, url: str, kind: str) -> str:
+        with self.logger.span('rate_limit_wait'):
+            self.limiter.acquire()
+
+        with self.logger.span('page_load'):
+            try:
+                response = self.pool.request('GET', url, timeout=self.timeout, retries=False)
+            except urllib3.exceptions.HTTPError as e:
+                self._failed()
+                raise FetchError(f"Network error: {e}")
+
+        html = response.data.decode('utf-8', errors='replace')
+        if is_challenge(html):
+            self._failed(challenge=True)
+            raise ChallengeError(f"Challenge page at {url}")
+        if response.status != 200:
+            self._failed()
+            raise FetchError(f"HTTP {response.status} at {url}")
+
+        self.limiter.on_success()
+        self.logger.count('pages_fetched')
+        return html
+
+    def _failed(self, challenge: bool = False):
+        if challenge:
+            self.limiter.on_challenge()
+            self.logger.count('challenge_pages')
+        else:
+            self.limiter.on_error()
+            self.logger.count('fetch_errors')
+
+    def restart(self):
+        pass  # the pool replaces broken connections by itself
+
+    def close(self):
+        pass  # the pool is shared between the workers
+
+
+# tries the http client first and falls back to a browser session (started only when needed) on challenge pages
+class FallbackFetcher:
+    def __init__(self, primary: HttpFetcher, fallback: BrowserFetcher):
+        self.primary = primary
+        self.fallback = fallback
+
+    def get(self, url: str, kind: str) -> str:
+        try:
+            return self.primary.get(url, kind)
+        except ChallengeError:
+            return self.fallback.get(url, kind)
+
+    def restart(self):
+        self.fallback.restart()
+
+    def close(self):
+        self.fallback.close()
+
+
+def http_pool(maxsize: int = 10) -> urllib3.PoolManager:
+    return urllib3.PoolManager(maxsize=maxsize, block=True, headers={'User-Agent': 'Mozilla/5.0'})
@@ -0,0 +1,116 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+
+# persistent record of the scrape: one row per match id (status, attempts, last error, results page) and the crawl checkpoints
+class ScrapeLedger:
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()  # the fetch workers and the writer share the same connection
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.submitted = set()  # ids handed to the fetch workers by this run (e.g. the retries), not to be queued twice
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS matches (
+                match_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                results_offset INTEGER,
+                updated_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS matches_status ON matches (status);
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                name TEXT PRIMARY KEY,
+                value INTEGER
+            );
+        """)
+
+    def seed_from_files(self, filepath: str):
+        # matches scraped before the ledger existed; the id is taken from the exact file name (match_<id>.csv)
+        match_ids = []
+        for name in os.listdir(filepath):
+            found = re.fullmatch(r'match_(\d+)\.csv', name)
+            if found:
+                match_ids.append(found.group(1))
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO matches (match_id, status, updated_at) VALUES (?, ?, ?)",
+                [(match_id, self.DONE, self._now()) for match_id in match_ids]
+            )
+
+    def add(self, match_ids: list, results_offset: int):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO matches (match_id, status, results_offset, updated_at) VALUES (?, ?, ?, ?)",
+                [(match_id, self.PENDING, results_offset, self._now()) for match_id in match_ids]
+            )
+
+    def status(self, match_id: str):
+        with self.lock:
+            row = self.conn.execute("SELECT status FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def mark_submitted(self, match_ids: list):
+        with self.lock:
+            self.submitted.update(match_ids)
+
+    def to_scrape(self, match_ids: list, max_attempts: int) -> list:
+        # keeps the ids that are not done yet, still have attempts left and were not submitted by this run yet (primary key
+        # lookups, no scan over the files)
+        with self.lock:
+            rows = dict(self.conn.execute(
+                f"SELECT match_id, status = ? OR attempts >= ? FROM matches WHERE match_id IN ({','.join('?' * len(match_ids))})",
+                [self.DONE, max_attempts, *match_ids]
+            ).fetchall()) if match_ids else {}
+            return [match_id for match_id in match_ids if not rows.get(match_id, False) and match_id not in self.submitted]
+
+    def retryable(self, max_attempts: int) -> list:
+        # matches listed in previous runs that are still pending or failed with attempts left; no need to walk the results pages again
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT match_id FROM matches WHERE status != ? AND attempts < ? ORDER BY results_offset, match_id",
+                (self.DONE, max_attempts)
+            ).fetchall()
+            return [row[0] for row in rows if row[0] not in self.submitted]
+
+    def mark_done(self, match_id: str):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE matches SET status = ?, last_error = NULL, updated_at = ? WHERE match_id = ?",
+                (self.DONE, self._now(), match_id)
+            )
+
+    def mark_failed(self, match_id: str, error: str):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE matches SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ? WHERE match_id = ?",
+                (self.FAILED, error, self._now(), match_id)
+            )
+
+    def count(self, status: str) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM matches WHERE status = ?", (status,)).fetchone()[0]
+
+    def get_checkpoint(self, name: str, default: int = None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_checkpoint(self, name: str, value: int):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO checkpoints (name, value) VALUES (?, ?)", (name, value))
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
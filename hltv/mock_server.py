@@ -0,0 +1,180 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import argparse
+import threading
+import random
+import time
+import os
+import re
+
+
+# local stand-in for hltv.org: serves saved pages (if any) or generated pages with the same structure, with configurable latency
+class MockHLTVServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, n_matches: int = 300, latency: tuple = (0.0, 0.0),
+                 challenge_rate: float = 0.0, pages_dir: str = None, seed: int = 42):
+        """
+        n_matches: number of matches listed in the results pages (100 per page, like hltv)
+        latency: (min, max) seconds added to each response
+        challenge_rate: fraction of the responses replaced by a challenge page ("Just a moment...")
+        pages_dir: folder with saved pages (results_<offset>.html, match_<id>.html, stats_<id>.html); missing pages are generated
+        """
+        self.n_matches = n_matches
+        self.latency = latency
+        self.challenge_rate = challenge_rate
+        self.pages_dir = pages_dir
+        self.random = random.Random(seed)
+        self.requests = 0
+
+        self.match_ids = [2369000 + 7 * idx for idx in range(n_matches)]
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def page(self, path: str, query: dict):
+        if path == '/' or path == '':
+            return '<html><head><title>HLTV.org</title></head><body>mock</body></html>'
+
+        if path == '/results':
+            offset = int(query.get('offset', ['0'])[0])
+            return self._saved(f'results_{offset}.html') or results_page(self.match_ids[offset:offset + 100])
+
+        match = re.match(r'^/matches/(\d+)/', path)
+        if match:
+            match_id = int(match.group(1))
+            return self._saved(f'match_{match_id}.html') or match_page(match_id)
+
+        match = re.match(r'^/stats/matches/(\d+)/', path)
+        if match:
+            match_id = int(match.group(1))
+            return self._saved(f'stats_{match_id}.html') or stats_page(match_id)
+
+        return None
+
+    def _saved(self, name: str):
+        if self.pages_dir is None or not os.path.exists(os.path.join(self.pages_dir, name)):
+            return None
+        with open(os.path.join(self.pages_dir, name), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                mock.requests += 1
+                time.sleep(mock.random.uniform(*mock.latency))
+
+                url = urlparse(self.path)
+                if mock.random.random() < mock.challenge_rate:
+                    status, body = 403, CHALLENGE_PAGE
+                else:
+                    body = mock.page(url.path, parse_qs(url.query))
+                    status = 200 if body is not None else 404
+                    body = body if body is not None else '<html><body>Not found</body></html>'
+
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # keep the console clean
+
+        return Handler
+
+
+CHALLENGE_PAGE = '<html><head><title>Just a moment...</title></head><body>Checking your browser</body></html>'
+
+COLUMNS = ['Op.K-D', 'Op.eK-eD', 'MKs', 'KAST', 'eKAST', '1vsX', 'K(hs)', 'eK(hs)', 'A(f)', 'D(t)', 'eD(t)', 'ADR', 'eADR',
+           'KAST', 'eKAST', 'Swing', 'Rating3.0']
+
+
+def results_page(match_ids: list):
+    if not match_ids:
+        return '<html><body><div class="results-holder"><div>No results with the chosen filters</div></div></body></html>'
+
+    links = ''.join(
+        f'<div class="result-con"><a href="/matches/{match_id}/team-a-vs-team-b" class="a-reset">match {match_id}</a></div>'
+        for match_id in match_ids
+    )
+    return f'<html><head><title>Results</title></head><body><div class="results-holder">{links}</div></body></html>'
+
+
+def match_page(match_id: int):
+    return (
+        '<html><head><title>Match</title></head><body>'
+        f'<div class="timeAndEvent"><div class="date" data-unix="{_match_unix(match_id)}"></div>'
+        f'<div class="event text-ellipsis"><a href="/events/1/mock-event">Mock Event {match_id % 5}</a></div></div>'
+        f'<div class="stats-detailed-stats"><a href="/stats/matches/{match_id}/team-a-vs-team-b" class="small-padding">Detailed stats</a></div>'
+        '</body></html>'
+    )
+
+
+def stats_page(match_id: int):
+    rng = random.Random(match_id)
+    tables = []
+    # hltv shows, for each team, the stats of the whole match followed by the CT and T sides; the scraper keeps the tables 0 and 3
+    for team in (f'Team A{match_id % 11}', f'Team B{match_id % 13}'):
+        players = [f'player_{rng.randint(0, 499)}' for _ in range(5)]
+        for _ in range(3):
+            tables.append(_stats_table(team, players, rng))
+
+    return f'<html><head><title>Detailed stats</title></head><body>{"".join(tables)}</body></html>'
+
+
+def _stats_table(team: str, players: list, rng: random.Random):
+    header = ''.join(f'<th>{column}</th>' for column in [team] + COLUMNS)
+    rows = []
+    for player in players:
+        kills, deaths, assists = rng.randint(5, 35), rng.randint(5, 30), rng.randint(0, 12)
+        opk, opd = rng.randint(0, 6), rng.randint(0, 6)
+        kast, adr, swing = round(rng.uniform(45, 85), 1), round(rng.uniform(40, 120), 1), round(rng.uniform(-5, 5), 2)
+        cells = [
+            player, f'{opk} : {opd}', f'{opk} : {opd}', rng.randint(0, 6), f'{kast}%', f'{kast}%', rng.randint(0, 2),
+            f'{kills}({rng.randint(0, kills)})', f'{kills}({rng.randint(0, kills)})', f'{assists}({rng.randint(0, assists)})',
+            f'{deaths}({rng.randint(0, deaths)})', f'{deaths}({rng.randint(0, deaths)})', adr, adr, f'{kast}%', f'{kast}%',
+            f'{swing:+.2f}%', round(rng.uniform(0.5, 1.6), 2)
+        ]
+        rows.append('<tr>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>')
+    return f'<table class="stats-table totalstats"><thead><tr>{header}</tr></thead><tbody>{"".join(rows)}</tbody></table>'
+
+
+def _match_unix(match_id: int):
+    # milliseconds, like the data-unix attribute of hltv; one match every ~3 hours from 2024-01-01
+    return (1704067200 + (match_id - 2369000) * 1500) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--matches', type=int, default=300)
+    parser.add_argument('--latency', type=float, nargs=2, default=(0.0, 0.0))
+    parser.add_argument('--challenge-rate', type=float, default=0.0)
+    parser.add_argument('--pages-dir', type=str, default=None)
+    args = parser.parse_args()
+
+    server = MockHLTVServer(port=args.port, n_matches=args.matches, latency=tuple(args.latency),
+                            challenge_rate=args.challenge_rate, pages_dir=args.pages_dir)
+    print(f'Serving mock HLTV on {server.base_url}')
+    server.server.serve_forever()
@@ -0,0 +1,85 @@
+import os
+import gzip
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+
+
+# raw copy of every fetched page: the html is gzip-compressed and stored once per content hash (identical pages share the file);
+# an sqlite index maps each (url, fetch time) to its content, so the pages can be parsed again later without any request
+class PageCache:
+    def __init__(self, path: str):
+        self.path = path
+        self.blobs_path = os.path.join(path, 'blobs')
+        os.makedirs(self.blobs_path, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(path, 'index.sqlite'), check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                kind TEXT,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (url, fetched_at)
+            );
+            CREATE INDEX IF NOT EXISTS pages_kind ON pages (kind);
+        """)
+
+    def put(self, url: str, html: str, kind: str = None) -> str:
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+
+        blob = self._blob_path(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp_path = f'{blob}.{threading.get_ident()}.tmp'
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.write(data)
+            os.replace(tmp_path, blob)
+
+        fetched_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO pages (url, fetched_at, kind, digest) VALUES (?, ?, ?, ?)",
+                              (url, fetched_at, kind, digest))
+        return digest
+
+    def get(self, digest: str) -> str:
+        with gzip.open(self._blob_path(digest), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def latest(self, url: str):
+        # most recent copy of the url, or None if it was never fetched
+        with self.lock:
+            row = self.conn.execute("SELECT digest FROM pages WHERE url = ? ORDER BY fetched_at DESC LIMIT 1", (url,)).fetchone()
+        return None if row is None else self.get(row[0])
+
+    def urls(self, kind: str) -> list:
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT url FROM pages WHERE kind = ? ORDER BY url", (kind,)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.conn.close()
+
+    def _blob_path(self, digest: str):
+        return os.path.join(self.blobs_path, digest[:2], f'{digest}.html.gz')
+
+
+# wraps a fetcher and stores every page it returns
+class CachingFetcher:
+    def __init__(self, fetcher, cache: PageCache):
+        self.fetcher = fetcher
+        self.cache = cache
+
+    def get(self, url: str, kind: str) -> str:
+        html = self.fetcher.get(url, kind)
+        self.cache.put(url, html, kind)
+        return html
+
+    def restart(self):
+        self.fetcher.restart()
+
+    def close(self):
+        self.fetcher.close()
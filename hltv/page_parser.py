@@ -0,0 +1,121 @@
+import pandas as pd
+import lxml.html
+from datetime import datetime, timezone
+import argparse
+import os
+import re
+
+
+class ParseError(Exception):
+    # the page was loaded but doesn't have what is expected (e.g. a match without stats); fetching it again won't help
+    pass
+
+
+# parsing of the hltv pages with lxml (C parser + xpath, only the needed nodes are visited); works on the html text, so it
+# doesn't matter if the page came from a browser, an http client or a saved file
+
+def parse_match_links(html: str) -> list:
+    tree = lxml.html.document_fromstring(html)
+    if check_empty_page(tree):
+        return []
+
+    # dict keeps the order of the links and makes the dedupe O(1) per link
+    match_ids = {}
+    for href in tree.xpath("//a[contains(@href, '/matches/')]/@href"):
+        found = re.search(r'/matches/(\d+)/', href)
+        if found:
+            match_ids.setdefault(found.group(1))
+
+    return list(match_ids)
+
+
+def check_empty_page(tree) -> bool:
+    return bool(tree.xpath("//div[text()='No results with the chosen filters']"))
+
+
+def parse_stats_link(html: str):
+    tree = lxml.html.document_fromstring(html)
+    links = tree.xpath("//a[@href][text()='Detailed stats']/@href")
+    return links[0] if links else None
+
+
+def parse_match_page(html: str) -> dict:
+    # the stats link plus the date (utc, from the data-unix milliseconds) and the event of the match, in one parse of the page
+    tree = lxml.html.document_fromstring(html)
+    links = tree.xpath("//a[@href][text()='Detailed stats']/@href")
+    unix = tree.xpath("//div[contains(concat(' ', normalize-space(@class), ' '), ' date ')]/@data-unix")
+    event = tree.xpath("//div[contains(concat(' ', normalize-space(@class), ' '), ' event ')]/a")
+
+    return {
+        'stats_link': links[0] if links else None,
+        'date': datetime.fromtimestamp(int(unix[0]) / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S') if unix else None,
+        'event': _text(event[0]) if event else None
+    }
+
+
+def add_match_info(df: pd.DataFrame, info: dict) -> pd.DataFrame:
+    # the date and the event go on every row of the match, after the stats
+    return df.assign(date=info['date'], event=info['event'])
+
+
+def parse_stats_tables(html: str, table_indexes: tuple = (0, 3)) -> pd.DataFrame:
+    # by default, get only the stats for the whole match (tables 0 and 3, one per team); the others are the per-side stats
+    tree = lxml.html.document_fromstring(html)
+    tables = tree.xpath('//table')
+
+    dfs = []
+    for idx, table in enumerate(tables):
+        if idx not in table_indexes:
+            continue
+
+        # convert stats table to pandas dataframe
+        headers = [_text(th) for th in table.iter('th')]
+        data = []
+        for row in table.iter('tr'):
+            row_data = [_text(cell) for cell in row.iter('td')]
+            if row_data:
+                data.append(row_data)
+
+        if headers:
+            df = pd.DataFrame(data, columns=headers)
+        else:
+            df = pd.DataFrame(data)
+
+        team_name = df.columns[0]
+        df.rename(columns={team_name: 'players'}, inplace=True)
+        df['team'] = team_name
+
+        dfs.append(df)
+
+    return pd.concat(dfs)
+
+
+def _text(element) -> str:
+    # same as BeautifulSoup's get_text(strip=True): every text piece is stripped before joining
+    return ''.join(piece.strip() for piece in element.itertext())
+
+
+def parse_saved_pages(pages_dir: str, filepath: str):
+    # rebuilds the match csv files from saved stats pages (stats_<match id>.html, and match_<match id>.html if present), without any request
+    for name in sorted(os.listdir(pages_dir)):
+        found = re.fullmatch(r'stats_(\d+)\.html', name)
+        if not found:
+            continue
+
+        with open(os.path.join(pages_dir, name), 'r', encoding='utf-8') as f:
+            df = parse_stats_tables(f.read())
+
+        # the date and the event are only known if the match page was saved too
+        match_page = os.path.join(pages_dir, f'match_{found.group(1)}.html')
+        if os.path.exists(match_page):
+            with open(match_page, 'r', encoding='utf-8') as f:
+                df = add_match_info(df, parse_match_page(f.read()))
+        df.to_csv(os.path.join(filepath, f'match_{found.group(1)}.csv'), index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pages_dir', help='folder with saved stats pages (stats_<match id>.html)')
+    parser.add_argument('filepath', help='folder where the match csv files are written')
+    args = parser.parse_args()
+    parse_saved_pages(args.pages_dir, args.filepath)
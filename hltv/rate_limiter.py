@@ -0,0 +1,56 @@
+import threading
+import time
+
+
+# token bucket whose rate adapts to the responses: it speeds up while pages load fine and backs off on errors or challenge pages
+class AdaptiveRateLimiter:
+    def __init__(self, rate: float = 0.5, min_rate: float = 0.05, max_rate: float = 2.0, capacity: float = 2.0,
+                 increase: float = 0.05, backoff: float = 0.5):
+        """
+        rate: requests per second to start with
+        min_rate, max_rate: bounds of the rate
+        capacity: maximum burst of requests
+        increase: added to the rate after each healthy response (additive increase)
+        backoff: rate multiplier after an error or a challenge page (multiplicative decrease)
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = capacity
+        self.increase = increase
+        self.backoff = backoff
+
+        self.tokens = 1.0
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # blocks until a request is allowed
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_error(self):
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.backoff)
+            self.tokens = min(self.tokens, 0.0)  # no burst right after an error
+
+    def on_challenge(self):
+        # challenge pages (e.g. cloudflare) mean we are going too fast; back off twice as hard as a regular error
+        self.on_error()
+        self.on_error()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
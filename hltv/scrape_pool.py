@@ -0,0 +1,183 @@
+import os
+import queue
+import threading
+from logger import Logger
+from ledger import ScrapeLedger
+from fetchers import FetchError, MATCH_PAGE, STATS_PAGE
+from page_parser import ParseError, add_match_info, parse_match_page, parse_stats_tables
+
+
+# runs n_workers fetch workers (each with its own fetcher) pulling match ids from a shared bounded queue; a separate thread
+# parses and writes the csv files. The pool can be fed while it runs (start, submit, close), e.g. page by page as the
+# results pages are listed; submit blocks while the queue is full, so the listing can't run too far ahead of the fetching
+class ScrapePool:
+    def __init__(self, logger: Logger, fetcher_factory, filepath: str, base_url: str, n_workers: int = 2, max_attempts: int = 3,
+                 ledger: ScrapeLedger = None, queue_size: int = None):
+        """
+        fetcher_factory: called once per worker, returns the fetcher (browser, http, ...) used by that worker only
+        max_attempts: attempts per match in this run; after each failure the worker restarts its own fetcher
+        ledger: if given, every saved match and every failed attempt is recorded in it
+        queue_size: match ids waiting for a worker (default: 4 per worker)
+        """
+        self.logger = logger
+        self.fetcher_factory = fetcher_factory
+        self.filepath = filepath
+        self.base_url = base_url
+        self.n_workers = n_workers
+        self.max_attempts = max_attempts
+        self.ledger = ledger
+        self.queue_size = queue_size or 4 * n_workers
+
+        self.saved = []
+        self.failed = []
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.workers = []
+        self.writer = None
+
+    def run(self, match_ids: list):
+        self.start()
+        try:
+            self.submit(match_ids)
+        finally:
+            self.close()
+
+    def start(self):
+        self.stopping.clear()
+        self.match_queue = queue.Queue(maxsize=self.queue_size)
+        self.parse_queue = queue.Queue(maxsize=2 * self.n_workers)  # bounded, so fetching can't run too far ahead of the writer
+
+        self.workers = [
+            threading.Thread(target=self._fetch_worker, args=(worker_id,), daemon=True)
+            for worker_id in range(self.n_workers)
+        ]
+        self.writer = threading.Thread(target=self._write_worker, daemon=True)
+
+        self.writer.start()
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, match_ids: list):
+        # blocks while the queue is full (backpressure); gives up once the pool is stopping
+        for match_id in match_ids:
+            if not put_until(self.match_queue, match_id, self.stopping):
+                return
+
+    def close(self):
+        # no more match ids: the workers finish the queue, then the writer finishes the pages already fetched
+        for _ in self.workers:
+            self.match_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+        self.parse_queue.put(None)  # no more pages; lets the writer finish
+        self.writer.join()
+
+    def stop(self):
+        """
+        Clean shutdown (e.g. on KeyboardInterrupt): the ids still queued are dropped (they stay pending in the ledger and are
+        retried by the next run), the matches being fetched are finished and every fetched page is parsed and written.
+        """
+        self.stopping.set()
+        while True:
+            try:
+                self.match_queue.get_nowait()
+            except queue.Empty:
+                break
+        self.close()
+
+    def _fetch_worker(self, worker_id: int):
+        fetcher = self.fetcher_factory()
+        try:
+            while True:
+                match_id = self.match_queue.get()
+                if match_id is None:
+                    return
+
+                for attempt in range(self.max_attempts):
+                    try:
+                        self.logger.log("[worker %s] Scraping match %s", worker_id, match_id)
+                        self.parse_queue.put((match_id, self._fetch_match(fetcher, match_id)))
+                        break
+                    except FetchError as e:
+                        self.logger.warning(f"[worker {worker_id}] Error scrapping match {match_id} (attempt {attempt + 1}/{self.max_attempts}): {e}")
+                        self.logger.count('retries')
+                        if self.ledger is not None:
+                            self.ledger.mark_failed(match_id, str(e))
+                        if self.stopping.is_set():
+                            break  # no more attempts while shutting down; the next run retries it
+                        fetcher.restart()
+                    except ParseError as e:
+                        # the page was loaded fine, so no retry and no restart
+                        self.logger.warning(f"[worker {worker_id}] Error parsing match {match_id}: {e}")
+                        if self.ledger is not None:
+                            self.ledger.mark_failed(match_id, f'Parsing error: {e}')
+                        with self.lock:
+                            self.failed.append(match_id)
+                        break
+                    except Exception as e:
+                        # anything else (a page the parser can't read, a crashed browser...) fails this match, not the worker
+                        self.logger.error(f"[worker {worker_id}] Unexpected error scrapping match {match_id}: {e}")
+                        if self.ledger is not None:
+                            self.ledger.mark_failed(match_id, f'Unexpected error: {e}')
+                        with self.lock:
+                            self.failed.append(match_id)
+                        self._restart(fetcher, worker_id)
+                        break
+                else:
+                    with self.lock:
+                        self.failed.append(match_id)
+        finally:
+            fetcher.close()
+
+    def _restart(self, fetcher, worker_id: int):
+        try:
+            fetcher.restart()
+        except Exception as e:
+            self.logger.warning(f"[worker {worker_id}] Error restarting the fetcher: {e}")
+
+    def _fetch_match(self, fetcher, match_id: str):
+        # the match page gives the stats link, the date and the event; returns (match info, stats page)
+        info = parse_match_page(fetcher.get(f"{self.base_url}/matches/{match_id}/x", MATCH_PAGE))
+        if info['stats_link'] is None:
+            raise ParseError("No 'Detailed stats' link in the match page")
+
+        return info, fetcher.get(f'{self.base_url}/{info["stats_link"].lstrip("/")}', STATS_PAGE)
+
+    def _write_worker(self):
+        while True:
+            item = self.parse_queue.get()
+            if item is None:
+                return
+
+            match_id, (info, html) = item
+            try:
+                filename = os.path.join(self.filepath, fr'match_{match_id}.csv')
+                with self.logger.span('parse'):
+                    df = add_match_info(parse_stats_tables(html), info)
+                with self.logger.span('write'):
+                    df.to_csv(filename, index=False)
+                self.logger.count('rows_parsed', len(df))
+                self.logger.count('matches_saved')
+                self.logger.log('File %s saved!', filename)
+                if self.ledger is not None:
+                    self.ledger.mark_done(match_id)
+                with self.lock:
+                    self.saved.append(match_id)
+            except Exception as e:
+                self.logger.error(f'Error parsing match {match_id}: {e}')
+                if self.ledger is not None:
+                    self.ledger.mark_failed(match_id, f'Parsing error: {e}')
+                with self.lock:
+                    self.failed.append(match_id)
+
+
+def put_until(items: queue.Queue, item, stop: threading.Event, timeout: float = 0.1) -> bool:
+    # put that blocks while the queue is full, but gives up (returns False) once stop is set
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            continue
+    return False
@@ -1,153 +1,197 @@
 import os
-import pandas as pd
-import undetected_chromedriver as uc
-from selenium.common.exceptions import InvalidSessionIdException
-from bs4 import BeautifulSoup
-import time
 import re
-from glob import glob
-import socket
-import urllib.error
+import queue
+import threading
 from logger import Logger
+from ledger import ScrapeLedger
+from rate_limiter import AdaptiveRateLimiter
+from fetchers import BrowserFetcher, HttpFetcher, FallbackFetcher, FetchError, RESULTS_PAGE, MATCH_PAGE, http_pool
+from page_cache import PageCache, CachingFetcher
+from page_parser import add_match_info, parse_match_links, parse_match_page, parse_stats_tables
+from scrape_pool import ScrapePool, put_until
 
 
 class HLTVScraper:
-    def __init__(self, logger: Logger, filepath: str, hltv_filter: str = None):
-        options = uc.ChromeOptions()
-        options.add_argument("--window-size=1920,1080")
-        options.add_argument("--window-position=-32000,-32000")  # hide window from screen; couldn't do headless, using this instead so one can use the computer screen
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--disable-software-rasterizer")
-        options.add_argument('--disable-blink-features=AutomationControlled')
-
-        self.driver = uc.Chrome(options=options)
-        self.delay = 2
-
+    def __init__(self, logger: Logger, filepath: str, hltv_filter: str = None, base_url: str = "https://www.hltv.org",
+                 n_workers: int = 1, fetcher: str = 'browser', limiter: AdaptiveRateLimiter = None, page_timeout: int = 30,
+                 ledger_path: str = None, resume: bool = True, max_total_attempts: int = 9, cache_path: str = None,
+                 prefetch_pages: int = 2):
+        """
+        base_url: can point to a local stand-in server (see mock_server.py)
+        n_workers: number of fetch workers scraping matches at the same time
+        fetcher: 'browser' (one chrome session per worker), 'http' (pooled http client) or 'auto' (http, falling back to a browser on challenge pages)
+        limiter: global politeness limit shared by all the workers
+        ledger_path: sqlite file recording each match (default: filepath/scrape_ledger.sqlite)
+        resume: start from the results page after the last one completed, instead of offset 0
+        max_total_attempts: attempts per match across all runs; failed matches are retried in the next runs until then
+        cache_path: folder of the raw page cache; every fetched page is kept there (default: filepath/page_cache)
+        prefetch_pages: results pages listed ahead of the matches being scraped
+        """
         self.logger = logger
-        self.logger.log("Opening HLTV.org...")
-        self.driver.get("https://www.hltv.org")
-        time.sleep(self.delay)
-
         self.filepath = filepath
         self.filter = hltv_filter
+        self.base_url = base_url.rstrip('/')
+        self.n_workers = n_workers
+        self.fetcher = fetcher
+        self.limiter = limiter if limiter is not None else AdaptiveRateLimiter()
+        self.page_timeout = page_timeout
+        self.ledger = ScrapeLedger(ledger_path or os.path.join(filepath, 'scrape_ledger.sqlite'))
+        self.resume = resume
+        self.max_total_attempts = max_total_attempts
+        self.page_cache = PageCache(cache_path or os.path.join(filepath, 'page_cache'))
+        self.prefetch_pages = prefetch_pages
+
+        self.http_pool = http_pool(maxsize=n_workers + 1)
+        self.listing_fetcher = self._new_fetcher()
+
+    def _new_fetcher(self):
+        # the browser sessions are only started on the first request, so creating fetchers is cheap
+        if self.fetcher == 'http':
+            fetcher = HttpFetcher(self.logger, self.limiter, pool=self.http_pool, timeout=self.page_timeout)
+        elif self.fetcher == 'auto':
+            fetcher = FallbackFetcher(
+                HttpFetcher(self.logger, self.limiter, pool=self.http_pool, timeout=self.page_timeout),
+                BrowserFetcher(self.logger, self.limiter, self.base_url, page_timeout=self.page_timeout)
+            )
+        else:
+            fetcher = BrowserFetcher(self.logger, self.limiter, self.base_url, page_timeout=self.page_timeout)
+        return CachingFetcher(fetcher, self.page_cache)
+
+    def replay(self, table_indexes: tuple = (0, 3)):
+        """
+        Rebuilds the match csv files from the page cache, without any browser or request.
+        table_indexes: stats tables to keep (e.g. add the per-side tables to get more data from the same pages)
+        """
+        match_urls = self.page_cache.urls(MATCH_PAGE)
+        self.logger.log(f"Replaying {len(match_urls)} cached matches...")
+
+        saved = 0
+        for url in match_urls:
+            match_id = re.search(r'/matches/(\d+)/', url).group(1)
+            # a cached page the parser can't read (e.g. an error page) skips the match, as in the writer of the pool
+            try:
+                info = parse_match_page(self.page_cache.latest(url))
+                if info['stats_link'] is None:
+                    continue
+
+                # same url the scraper built for the stats page, with the base of the cached match page
+                stats_html = self.page_cache.latest(f'{url[:url.index("/matches/")]}/{info["stats_link"].lstrip("/")}')
+                if stats_html is None:
+                    self.logger.log(f"Stats page of match {match_id} is not in the cache")
+                    continue
+
+                df = add_match_info(parse_stats_tables(stats_html, table_indexes=table_indexes), info)
+            except Exception as e:
+                self.logger.error(f'Error parsing match {match_id}: {e}')
+                continue
+
+            filename = os.path.join(self.filepath, fr'match_{match_id}.csv')
+            df.to_csv(filename, index=False)
+            saved += 1
+
+        self.logger.log(f"{saved} matches rebuilt from the cache")
+        return saved
 
     def _get_match_links(self, offset=0):
-        url = f"https://www.hltv.org/results?offset={offset}"
+        url = f"{self.base_url}/results?offset={offset}"
         if self.filter is not None:
             url = url + self.filter
 
         try:
             self.logger.log(f"Loading results page (offset {offset})...")
-            if not self._safe_get(url):
-                return []
-            time.sleep(15)
-
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            if self._check_empty_page(soup):
-                return []
-
-            match_ids = []
-            all_links = soup.find_all('a', href=True)
-
-            for link in all_links:
-                href = link['href']
-                if '/matches/' in href and re.search(r'/matches/(\d+)/', href):
-                    match_id = re.search(r'/matches/(\d+)/', href).group(1)
-                    if match_id not in match_ids:
-                        match_ids.append(match_id)
-
+            html = self.listing_fetcher.get(url, RESULTS_PAGE)
+            with self.logger.span('parse_listing'):
+                match_ids = parse_match_links(html)
             self.logger.log(f"Found {len(match_ids)} match links")
-            time.sleep(self.delay)
-
             return match_ids
 
-        except Exception as e:
-            self.logger.log(f"Error getting match links: {e}")
-            return []
+        except FetchError as e:
+            self.logger.warning(f"Error getting match links: {e}")
+            return None
 
-    @staticmethod
-    def _check_empty_page(soup: BeautifulSoup) -> bool:
-        empty = soup.find('div', string='No results with the chosen filters')
-        return False if empty is None else True
+    def scrape_all_matches(self):
+        """
+        Pipelined crawl: a listing thread reads the results pages up to prefetch_pages ahead, the fetch workers of the pool
+        scrape the matches and its writer thread parses and saves them; the queues between the stages are bounded, so a
+        slow stage holds back the ones before it.
+        """
+        self.ledger.seed_from_files(self.filepath)  # files scraped before the ledger existed
+        pool = ScrapePool(self.logger, self._new_fetcher, self.filepath, self.base_url, n_workers=self.n_workers, ledger=self.ledger)
+        pages = queue.Queue(maxsize=max(1, self.prefetch_pages))
+        stop = threading.Event()
+        listing = threading.Thread(target=self._list_pages, args=(pages, stop), name='listing', daemon=True)
+        pool.start()
 
-    def _scrape_match_page(self, match_id):
         try:
-            self.logger.log('Loading match page...')
-            url = f"https://www.hltv.org/matches/{match_id}/x"
-            if not self._safe_get(url):
-                return False
-            time.sleep(5)
-
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            stat_link = soup.find('a', href=True, string='Detailed stats')
-
-            stat_url = f'https://www.hltv.org/{stat_link["href"]}'
-            if not self._safe_get(stat_url):
-                return False
-            time.sleep(self.delay)
-
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            tables = soup.find_all('table')
-
-            dfs = []
-            for idx, table in enumerate(tables):
-                if idx not in [0, 3]:
-                    continue  # get only the stats for the whole match
-
-                # convert stats table to pandas dataframe
-                headers = []
-                for th in table.find_all("th"):
-                    headers.append(th.get_text(strip=True))
-
-                data = []
-                for row in table.find_all("tr"):
-                    row_data = [cell.get_text(strip=True) for cell in row.find_all("td")]
-                    if row_data:
-                        data.append(row_data)
-
-                if headers:
-                    df = pd.DataFrame(data, columns=headers)
-                else:
-                    df = pd.DataFrame(data)
-
-                team_name = df.columns[0]
-                df.rename(columns={team_name: 'players'}, inplace=True)
-                df['team'] = team_name
-
-                dfs.append(df)
+            retry = self.ledger.retryable(self.max_total_attempts)
+            if retry:
+                self.logger.log(f"Retrying {len(retry)} matches left from previous runs...")
+                self.ledger.mark_submitted(retry)
+                pool.submit(retry)
+
+            listing.start()
+            while True:
+                page = pages.get()
+                if page is None:
+                    break
+
+                offset, match_ids = page
+                self.logger.log(f"\n{'=' * 60}")
+                self.logger.log(f"Processing results page (offset {offset})")
+                self.logger.log(f"Progress: {self.ledger.count(ScrapeLedger.DONE)} matches")
+                self.logger.log(f"{'=' * 60}\n")
 
-            filename = os.path.join(self.filepath, fr'match_{match_id}.csv')
-            pd.concat(dfs).to_csv(filename, index=False)
-            self.logger.log(f'File {filename} saved!')
-            return True
+                # skip if already scraped, or already submitted by this run (the retries, when the listing starts over)
+                self.ledger.add(match_ids, offset)
+                pending = self.ledger.to_scrape(match_ids, self.max_total_attempts)
+                self.logger.log(f"Skipping {len(match_ids) - len(pending)} matches (already scraped or queued)")
 
-        except Exception as e:
-            if "invalid session id" in str(e).lower():
-                self.logger.log(f'Error scrapping match page. Trying to reconnect to chrome...')
-                self._restart_chrome()
-            else:
-                self.logger.log(f'Error scrapping match page: {str(e)}')
+                self.ledger.mark_submitted(pending)
+                pool.submit(pending)
+                # the ids are in the ledger (pending) before the checkpoint moves, so an interrupted run retries them
+                self.ledger.set_checkpoint('next_offset', offset + 100)
 
-            return False
+            # the whole listing was walked; the next run starts from the first page again (to pick up new matches)
+            if self.end_of_listing:
+                self.ledger.set_checkpoint('next_offset', 0)
+            pool.close()
+            if self.listing_failed:
+                self.logger.error(f"Crawl not complete (listing failed); {self.ledger.count(ScrapeLedger.DONE)} matches saved, "
+                                  f"the next run resumes from the last results page")
 
-    def scrape_all_matches(self):
-        files = glob(os.path.join(self.filepath, '*.csv'))
+        except KeyboardInterrupt:
+            self.logger.log("Interrupted! Finishing the matches in flight...")
+            stop.set()
+            pool.stop()
+            self.logger.log(f"{self.ledger.count(ScrapeLedger.DONE)} matches saved")
 
-        try:
-            offset = 0
-            consecutive_failures = 0
+        except Exception as e:
+            self.logger.error(f"Unexpected error: {e}")
+            stop.set()
+            pool.stop()
+            self.logger.log(f"Saved {self.ledger.count(ScrapeLedger.DONE)} matches before error")
 
-            while consecutive_failures < 2:
-                self.logger.log(f"\n{'=' * 60}")
-                self.logger.log(f"Processing results page (offset {offset})")
-                self.logger.log(f"Progress: {len(files)} matches")
-                self.logger.log(f"{'=' * 60}\n")
+        finally:
+            stop.set()
+            if listing.is_alive():
+                listing.join()
+            self.logger.log("Closing browser...")
+            self.listing_fetcher.close()
+            self.logger.log_summary()
+
+    def _list_pages(self, pages: queue.Queue, stop: threading.Event):
+        # listing stage: puts (offset, match ids) for each results page, then None; stops after two empty or failed pages in a row
+        offset = self.ledger.get_checkpoint('next_offset', 0) if self.resume else 0
+        consecutive_failures = 0
+        self.end_of_listing = False
+        self.listing_failed = False
 
+        try:
+            while consecutive_failures < 2 and not stop.is_set():
                 match_ids = self._get_match_links(offset)
 
                 if not match_ids:
+                    self.end_of_listing = match_ids is not None  # an empty page, not an error
                     consecutive_failures += 1
                     self.logger.log(f"No matches found (failure #{consecutive_failures})")
 
@@ -155,77 +199,13 @@ class HLTVScraper:
                     continue
 
                 consecutive_failures = 0  # reset on success
-
-                for match_id in match_ids:
-                    # skip if already scraped
-                    if any(match_id in m for m in files):
-                        self.logger.log(f"({len(files) + 1}) Skipping {match_id} (already scraped)")
-                        continue
-
-                    self.logger.log(f"\n({len(files) + 1}) Scraping match {match_id}")
-
-                    # get match page data
-                    match_data = self._scrape_match_page(match_id)
-
-                    if match_data:
-                        filename = os.path.join(self.filepath, fr'match_{match_id}.csv')
-                        files.append(filename)
-
+                if not put_until(pages, (offset, match_ids), stop):
+                    return
                 offset += 100  # move to next page
-
-        except KeyboardInterrupt:
-            self.logger.log(f"Interrupted! {len(files)} matches saved...")
-
         except Exception as e:
-            self.logger.log(f"Unexpected error: {e}")
-            self.logger.log(f"Saved {len(files)} matches before error")
-
+            # e.g. chrome failing to start; without the sentinel the crawl would end as if the whole listing had been walked
+            self.logger.error(f"Listing stopped at offset {offset} by an unexpected error: {e}")
+            self.listing_failed = True
+            self.end_of_listing = False
         finally:
-            self.logger.log("Closing browser...")
-            self._safe_close()
-
-    def _safe_get(self, url, max_retries=3):
-        for attempt in range(max_retries):
-            try:
-                self.driver.get(url)
-                return True
-            except (socket.gaierror, urllib.error.URLError) as e:
-                self.logger.log(f"Network error: {e} (attempt {attempt + 1}/{max_retries})")
-                time.sleep(5 * (attempt + 1))
-            except Exception as e:
-                if "invalid session id" in str(e).lower():
-                    self.logger.log("Session dead, restarting Chrome...")
-                    self._restart_chrome()
-                else:
-                    self.logger.log(f"Other error while loading {url}: {e}")
-                time.sleep(5)
-        self.logger.log(f"Failed to load {url} after {max_retries} retries")
-        return False
-
-    def _safe_close(self):
-        try:
-            self.driver.quit()
-        except InvalidSessionIdException:
-            self.logger.log("Driver already quit (ignored)")
-        except Exception as e:
-            self.logger.log(f"Error quitting driver: {e}")
-
-    def _restart_chrome(self, wait_time: int = 60):
-        self.logger.log("\nRestarting Chrome driver...")
-        self._safe_close()
-        time.sleep(wait_time)  # quit driver and wait before restarting (trying to avoid connection timeout)
-
-        options = uc.ChromeOptions()
-        options.add_argument("--window-size=1920,1080")
-        options.add_argument("--window-position=-32000,-32000")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--disable-software-rasterizer")
-        options.add_argument('--disable-blink-features=AutomationControlled')
-
-        self.driver = uc.Chrome(options=options)
-
-        self.logger.log("Reopening HLTV.org...")
-        self.driver.get("https://www.hltv.org")
-        time.sleep(self.delay)
+            put_until(pages, None, stop)
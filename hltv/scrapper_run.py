@@ -1,14 +1,29 @@
 from scrapper_engine import HLTVScraper
 from dotenv import load_dotenv
+import argparse
 import os
 from logger import Logger
 
 
 load_dotenv()
 
+parser = argparse.ArgumentParser()
+parser.add_argument('--workers', type=int, default=1, help='number of matches scraped at the same time')
+parser.add_argument('--fetcher', choices=['browser', 'http', 'auto'], default='browser')
+parser.add_argument('--base-url', type=str, default='https://www.hltv.org', help='e.g. the address of mock_server.py')
+parser.add_argument('--replay', action='store_true', help='rebuild the csv files from the page cache, without scraping')
+parser.add_argument('--prefetch-pages', type=int, default=2, help='results pages listed ahead of the matches being scraped')
+parser.add_argument('--metrics', type=str, default=None, help='json lines file for the timing spans and counters of the run')
+args = parser.parse_args()
+
 
 # filter: get only the matches from 2024 to 2025 and that contain at least one hltv top 20 team (stars=1)
 hltv_filter = "&startDate=2024-01-01&endDate=2025-10-23&stars=1"
 
-scrap = HLTVScraper(Logger(), os.getenv('FILEPATH'), hltv_filter=hltv_filter)
-scrap.scrape_all_matches()
+logger = Logger(metrics=args.metrics is not None, metrics_path=args.metrics)
+scrap = HLTVScraper(logger, os.getenv('FILEPATH'), hltv_filter=hltv_filter, base_url=args.base_url,
+                    n_workers=args.workers, fetcher=args.fetcher, prefetch_pages=args.prefetch_pages)
+if args.replay:
+    scrap.replay()
+else:
+    scrap.scrape_all_matches()
@@ -1,23 +1,321 @@
 from datetime import datetime
-import re
+import threading
+import functools
+import atexit
+import queue
+import json
+import time
+import sys
+import os
 
+try:
+    import resource  # not available on windows; the peak memory is left out there
+except ImportError:
+    resource = None
 
-# class to deal with logging in general
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+
+# class to deal with logging in general; with metrics=True it also records timing spans, counters and histograms
 class Logger:
-    def __init__(self):
-        pass
+    def __init__(self, metrics: bool = False, metrics_path: str = None, level: int = INFO, log_path: str = None,
+                 background: bool = True, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3):
+        """
+        metrics: enables the spans, counters and histograms (when disabled they cost a single attribute check)
+        metrics_path: file where the metrics are appended as json lines (default: printed)
+        level: messages below this level are dropped before being formatted
+        log_path: file for the messages, rotated at max_bytes with backup_count old copies (default: printed)
+        background: formats and writes the messages in a background thread; the caller only pays an enqueue
+        """
+        self.metrics = metrics
+        self.metrics_path = metrics_path
+        self.level = level
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+
+        self.writer = LogWriter(log_path, background=background, max_bytes=max_bytes, backup_count=backup_count)
+        self.metrics_writer = self.writer if metrics_path is None else LogWriter(metrics_path, background=background, max_bytes=max_bytes,
+                                                                                backup_count=backup_count)
+
+    def log(self, message: str, *args, use_time: bool = True, level: int = INFO):
+        """
+        Formatting is lazy: with args, the message is a %-format string (logger.log('Opening %s...', filename)) and
+        is only formatted by the writer, after the level check.
+        """
+        if level < self.level:
+            return
+        self.writer.put((time.time(), level, message, args, use_time))
+
+    def debug(self, message: str, *args):
+        self.log(message, *args, level=DEBUG)
+
+    def info(self, message: str, *args):
+        self.log(message, *args, level=INFO)
+
+    def warning(self, message: str, *args):
+        self.log(message, *args, level=WARNING)
+
+    def error(self, message: str, *args):
+        self.log(message, *args, level=ERROR)
+
+    def flush(self):
+        self.writer.flush()
+        if self.metrics_writer is not self.writer:
+            self.metrics_writer.flush()
+
+    def close(self):
+        self.writer.close()
+        if self.metrics_writer is not self.writer:
+            self.metrics_writer.close()
+
+    def span(self, name: str):
+        """
+        Times a block (with logger.span('parse'): ...) or a function (@logger.span('parse')); the duration goes to the
+        histogram <name>_ms and is emitted as a json line.
+        """
+        if not self.metrics:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def count(self, name: str, value: int = 1):
+        if not self.metrics:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        if not self.metrics:
+            return
+        with self.lock:
+            self.histograms.setdefault(name, []).append(value)
+
+    def emit(self, record: dict):
+        if not self.metrics:
+            return
+
+        self.metrics_writer.put(json.dumps({'ts': datetime.now().isoformat(timespec='milliseconds'), **record}))
+
+    def summary(self) -> dict:
+        with self.lock:
+            histograms = {name: _describe(values) for name, values in self.histograms.items()}
+            counters = dict(self.counters)
+        return {
+            'elapsed_s': round(time.perf_counter() - self.started_at, 3),
+            'peak_rss_mb': peak_rss_mb(),
+            'counters': counters,
+            'histograms': histograms
+        }
+
+    def log_summary(self):
+        # end of a run: one json line with everything, plus a readable table
+        if not self.metrics:
+            return
+
+        summary = self.summary()
+        self.emit({'type': 'summary', **summary})
+
+        self.log(f"Run summary ({summary['elapsed_s']}s, peak RSS {summary['peak_rss_mb']} MB)")
+        for name, value in sorted(summary['counters'].items()):
+            self.log(f'  {name}: {value}', use_time=False)
+        for name, stats in sorted(summary['histograms'].items()):
+            self.log(f"  {name}: n={stats['count']} total={stats['sum']} mean={stats['mean']} p95={stats['p95']} max={stats['max']}", use_time=False)
+
+
+# writes the log records; in background mode a daemon thread drains the queue in batches (one write and flush per batch),
+# and the records still queued are written at exit
+class LogWriter:
+    def __init__(self, path: str = None, background: bool = True, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3,
+                 batch_size: int = 512):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.background = background
+        self.file = None
+        self.size = 0
+        self.lock = threading.Lock()
+        self.last_second = None
+        self.stamp = None
+
+        self.queue = None
+        self.thread = None
+        if background:
+            self.queue = queue.SimpleQueue()
+            self.thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    def put(self, record):
+        # a record is a raw line (str) or a (timestamp, level, message, args, use_time) tuple
+        if self.queue is not None:
+            self.queue.put(record)
+        else:
+            with self.lock:
+                self._write([self._format(record)])
+
+    def flush(self):
+        # blocks until everything queued before the call is written
+        if self.queue is None or not self.thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self.queue is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            events = []
+            stop = False
+            for record in batch:
+                if record is None:
+                    stop = True
+                elif isinstance(record, threading.Event):
+                    events.append(record)
+                else:
+                    try:
+                        lines.append(self._format(record))
+                    except Exception as e:  # a bad format string must not kill the writer
+                        lines.append(f'Could not format log record {record!r}: {e}\n')
+
+            if lines:
+                self._write(lines)
+            for event in events:
+                event.set()
+            if stop:
+                return
+
+    def _format(self, record) -> str:
+        if isinstance(record, str):
+            return record + '\n'
+
+        timestamp, level, message, args, use_time = record
+        if args:
+            message = message % args
+        if level >= WARNING:
+            message = f'{LEVEL_NAMES[level]}: {message}'
+        if not use_time:
+            return message + '\n'
+
+        # the timestamp has a 1 second resolution, so it's only formatted again when the second changes
+        second = int(timestamp)
+        if second != self.last_second:
+            self.last_second = second
+            self.stamp = datetime.fromtimestamp(second).strftime('%Y-%m-%d %H:%M:%S')
+
+        if message.startswith('\n'):
+            return f'\n[{self.stamp}] {message[1:]}\n'
+        return f'[{self.stamp}] {message}\n'
+
+    def _write(self, lines: list):
+        if self.path is None:
+            sys.stdout.write(''.join(lines))
+            sys.stdout.flush()
+            return
+
+        if self.file is None:
+            self._open()
+        for line in lines:
+            # the file object buffers the lines, the flush below is still one per batch
+            if self.size + len(line) > self.max_bytes and self.size > 0:
+                self._rotate()
+            self.file.write(line)
+            self.size += len(line)
+        self.file.flush()
+
+    def _open(self):
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.size = self.file.tell()
+
+    def _rotate(self):
+        # log > log.1 > log.2 ...; the oldest copy is dropped
+        self.file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+class Span:
+    def __init__(self, logger: Logger, name: str):
+        self.logger = logger
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        self.logger.observe(f'{self.name}_ms', elapsed_ms)
+        self.logger.emit({'type': 'span', 'name': self.name, 'ms': round(elapsed_ms, 3), 'ok': exc_type is None})
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(self.logger, self.name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+# returned by Logger.span when the metrics are disabled
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def __call__(self, func):
+        return func
+
+
+NULL_SPAN = NullSpan()
+
 
-    @staticmethod
-    def log(message: str, use_time: bool = True):
-        if use_time:
-            formatted_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on linux, bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
 
-            if re.search(r'^\n', message):
-                new_message = re.sub(r'^\n', '', message)
-                message = f"\n[{formatted_time}] {new_message}"
-            else:
-                message = f'[{formatted_time}] {message}'
 
-        print(message)
+def _describe(values: list) -> dict:
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'sum': round(sum(ordered), 3),
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'p50': round(ordered[len(ordered) // 2], 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max': round(ordered[-1], 3)
+    }
 
 # test commit